@@ -0,0 +1,152 @@
+import csv
+import io
+from datetime import date, datetime, timedelta
+from typing import Iterator
+from sqlalchemy import select
+from .database import SessionLocal
+from .models import IST, AttendanceRecord, Student
+
+# pyarrow is optional, only needed for the parquet/arrow formats, and
+# imported by the first such export (see pyarrow_available)
+pa = pq = None
+
+# Rows fetched (and written) per round trip; memory stays at about one batch
+EXPORT_BATCH_SIZE = 10000
+
+COLUMNS = ["record_id", "student_id", "full_name", "attendance_date", "timestamp", "status"]
+
+# format -> (media type, file extension, needs pyarrow)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv", False),
+    "parquet": ("application/vnd.apache.parquet", "parquet", True),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", True),
+}
+
+
+def pyarrow_available() -> bool:
+    """Import pyarrow (once); False when it is not installed."""
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow as pa_module
+            import pyarrow.parquet as pq_module
+        except ImportError:
+            return False
+        pa, pq = pa_module, pq_module
+    return True
+
+
+def arrow_schema():
+    return pa.schema([
+        ("record_id", pa.int64()),
+        ("student_id", pa.string()),
+        ("full_name", pa.string()),
+        ("attendance_date", pa.date32()),
+        ("timestamp", pa.timestamp("us")),  # IST wall time
+        ("status", pa.string()),
+    ])
+
+
+def export_statement(from_date: date = None, to_date: date = None):
+    """Attendance joined with students, in (timestamp, id) order."""
+    record = AttendanceRecord
+    statement = (
+        select(record.id, Student.student_id, Student.full_name, record.attendance_date, record.timestamp, record.status)
+        .join(Student, Student.id == record.student_id)
+        .order_by(record.timestamp, record.id)
+    )
+    if from_date is not None:
+        statement = statement.where(record.timestamp >= datetime.combine(from_date, datetime.min.time(), IST))
+    if to_date is not None:
+        statement = statement.where(record.timestamp < datetime.combine(to_date + timedelta(days=1), datetime.min.time(), IST))
+    return statement
+
+
+def _ist_wall_time(timestamp: datetime) -> datetime:
+    # SQLite hands back the stored IST wall time; PostgreSQL an aware value
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(IST).replace(tzinfo=None)
+    return timestamp
+
+
+def _batches(statement) -> Iterator[list]:
+    # Own session rather than the request's: the response body is produced
+    # after the endpoint returns. yield_per streams from a server-side cursor
+    # where the driver supports one.
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for partition in result.partitions():
+            yield [
+                (record_id, student_id, full_name, day, _ist_wall_time(timestamp), status)
+                for record_id, student_id, full_name, day, timestamp, status in partition
+            ]
+    finally:
+        db.close()
+
+
+def iter_csv(statement) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in _batches(statement):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object collecting the bytes a pyarrow writer emits."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow(statement, export_format: str) -> Iterator[bytes]:
+    """Parquet (one row group per batch) or Arrow IPC stream bytes."""
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+    for rows in _batches(statement):
+        columns = zip(*rows)
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(statement, export_format: str) -> Iterator[bytes]:
+    if export_format == "csv":
+        return iter_csv(statement)
+    return iter_arrow(statement, export_format)
@@ -0,0 +1,334 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List
+from sqlalchemy.exc import IntegrityError
+from .database import SessionLocal
+from .models import AttendanceRecord, attendance_day
+from .metrics import Counter, Gauge, registry
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Define IST timezone offset (UTC+5:30)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+FLUSHED = registry.register(Counter(
+    "attendance_queue_flushed_total", "Queued attendance events written to the database", labels=("result",),
+))
+
+
+class AttendanceWriteQueue:
+    """Write-behind attendance marking with group commit.
+
+    ``offer`` decides "marked" / "already marked" from an in-memory set of
+    the students marked per IST day (falling back to one indexed lookup for
+    students not in it yet, who may have been marked by another route or
+    server process) and returns without writing; a background writer
+    inserts the accepted events every ``flush_interval_ms`` or as soon as
+    ``flush_max_events`` are waiting, in one transaction per batch. Flushes
+    go through ``crud.insert_attendance_ignore_duplicates``: a student marked
+    meanwhile elsewhere is skipped by the per-day unique index.
+
+    Every accepted event is first appended to this process's log,
+    ``<log_path>.<pid>``, so events not yet written survive a crash. A
+    running process holds a ``flock`` on ``<log_path>.<pid>.lock``;
+    ``recover`` only replays the logs of processes that no longer hold
+    theirs, so server workers starting up never touch each other's logs.
+    """
+
+    def __init__(self, log_path: str, flush_interval_ms: float, flush_max_events: int):
+        self.log_path = log_path
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_max_events = flush_max_events
+        self._marked = {}  # IST day -> student ids marked (or queued) that day
+        self._pending: List[dict] = []
+        self._log = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one batch (and .flushing log) at a time
+        self._wake = None
+        self._writer = None
+        self._process_lock = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None
+
+    @property
+    def process_log_path(self) -> str:
+        # Worked out on use: workers forked from a preloading master must
+        # not share the master's log
+        return f"{self.log_path}.{os.getpid()}"
+
+    def _flushing_path(self) -> str:
+        return self.process_log_path + ".flushing"
+
+    def _open_log(self):
+        self._log = open(self.process_log_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _read_events(paths: List[str]) -> List[dict]:
+        events = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        event = json.loads(line)
+                        event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+                    except (ValueError, KeyError):
+                        # A torn last line from a crash mid-append
+                        continue
+                    events.append(event)
+        return events
+
+    def _orphaned_logs(self) -> dict:
+        """pid -> log files of processes that left them behind (caller holds the recovery lock)."""
+        pattern = re.compile(re.escape(os.path.basename(self.log_path)) + r"(?:\.(\d+))?(?:\.flushing)?$")
+        logs = {}
+        for path in glob.glob(glob.escape(self.log_path) + "*"):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                # Logs without a pid predate per-process logs
+                logs.setdefault(match.group(1), []).append(path)
+        return logs
+
+    def recover(self):
+        """Write events left in logs by processes that are gone, then delete those logs.
+
+        Logs whose process still holds its lock (another server worker) are
+        left alone. Also takes this process's lock, which is kept until
+        ``stop``.
+        """
+        with open(self.log_path + ".lock", "a") as recovery_lock:
+            fcntl.flock(recovery_lock, fcntl.LOCK_EX)
+            try:
+                for pid, paths in self._orphaned_logs().items():
+                    owner_lock = None
+                    if pid is not None:
+                        owner_lock = open(f"{self.log_path}.{pid}.lock", "a")
+                        try:
+                            fcntl.flock(owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except BlockingIOError:
+                            owner_lock.close()
+                            continue
+                    try:
+                        # The .flushing batch is older than the live log
+                        paths.sort(key=lambda path: not path.endswith(".flushing"))
+                        events = self._read_events(paths)
+                        if events:
+                            self._write(events)
+                            logger.info(f"Recovered {len(events)} queued attendance events from {', '.join(paths)}")
+                        for path in paths:
+                            os.remove(path)
+                    finally:
+                        if owner_lock is not None:
+                            os.remove(owner_lock.name)
+                            owner_lock.close()
+                if self._process_lock is None:
+                    self._process_lock = open(self.process_log_path + ".lock", "a")
+                    fcntl.flock(self._process_lock, fcntl.LOCK_EX)
+            finally:
+                fcntl.flock(recovery_lock, fcntl.LOCK_UN)
+
+    def seed(self, db):
+        """Load today's already-marked students so repeats are answered from memory."""
+        today = datetime.now(IST).date()
+        student_ids = {
+            student_id for (student_id,) in
+            db.query(AttendanceRecord.student_id).filter(AttendanceRecord.attendance_date == today)
+        }
+        with self._lock:
+            self._marked = {today: student_ids}
+
+    def _marked_in_db(self, db, student_id: int, day) -> bool:
+        return db.query(AttendanceRecord.id).filter(
+            AttendanceRecord.student_id == student_id, AttendanceRecord.attendance_date == day
+        ).first() is not None
+
+    def offer(self, db, student_id: int, status: str = "present", timestamp: datetime = None) -> bool:
+        """Queue a student's attendance; False if they are already marked that day.
+
+        Students not in the in-memory set are looked up in ``db`` first:
+        the bulk, batch and manual routes (and other server processes)
+        write their marks straight to the database.
+        """
+        timestamp = timestamp or datetime.now(IST)
+        day = attendance_day(timestamp)
+        event = {"student_id": student_id, "status": status, "timestamp": timestamp}
+        with self._lock:
+            if student_id in self._marked.get(day, ()):
+                return False
+        already_marked = self._marked_in_db(db, student_id, day)
+        with self._lock:
+            marked = self._marked.setdefault(day, set())
+            if already_marked or student_id in marked:
+                marked.add(student_id)
+                return False
+            marked.add(student_id)
+            if self._log is None:
+                self._open_log()
+            # Buffered write: the OS holds it across a process crash without
+            # an fsync per scan
+            self._log.write(json.dumps({**event, "timestamp": timestamp.isoformat()}) + "\n")
+            self._log.flush()
+            self._pending.append(event)
+            full = len(self._pending) >= self.flush_max_events
+        if full and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def forget(self, student_id: int):
+        """Drop a (deleted) student from the dedupe set and the pending events."""
+        with self._lock:
+            for marked in self._marked.values():
+                marked.discard(student_id)
+            self._pending = [event for event in self._pending if event["student_id"] != student_id]
+
+    def clear(self):
+        with self._lock:
+            self._marked = {}
+            self._pending = []
+            if self._log is not None:
+                self._log.truncate(0)
+
+    def flush(self) -> int:
+        """Write every pending event in one transaction; returns events written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            if not self._pending:
+                return 0
+            events, self._pending = self._pending, []
+            # Events accepted from now on go to a new log; the old one is
+            # deleted once this batch is committed
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            os.replace(self.process_log_path, self._flushing_path())
+            today = datetime.now(IST).date()
+            self._marked = {day: marked for day, marked in self._marked.items() if day >= today}
+        try:
+            written = self._write(events)
+        except Exception:
+            # Database unavailable: keep the batch (and its log lines) for the next flush
+            with self._lock:
+                self._pending = events + self._pending
+                if self._log is None:
+                    self._open_log()
+                with open(self._flushing_path(), encoding="utf-8") as flushing:
+                    self._log.write(flushing.read())
+                self._log.flush()
+            os.remove(self._flushing_path())
+            raise
+        os.remove(self._flushing_path())
+        return written
+
+    def _write(self, events: List[dict]) -> int:
+        from .crud import insert_attendance_ignore_duplicates  # crud imports this module
+
+        db = SessionLocal()
+        try:
+            try:
+                inserted = insert_attendance_ignore_duplicates(db, events)
+                db.commit()
+                written = len(inserted)
+            except IntegrityError as e:
+                # One bad event (e.g. a student deleted meanwhile) must not
+                # hold back the rest of the batch
+                db.rollback()
+                logger.error(f"Attendance batch of {len(events)} failed, retrying one by one: {str(e)}")
+                written = 0
+                for event in events:
+                    try:
+                        written += len(insert_attendance_ignore_duplicates(db, [event]))
+                        db.commit()
+                    except IntegrityError as e:
+                        db.rollback()
+                        FLUSHED.inc("failed")
+                        logger.error(f"Dropping queued attendance for student {event['student_id']}: {str(e)}")
+        finally:
+            db.close()
+        if written:
+            FLUSHED.inc("inserted", amount=written)
+        if len(events) > written:
+            FLUSHED.inc("duplicate", amount=len(events) - written)
+        logger.debug(f"Flushed {written} of {len(events)} queued attendance events")
+        return written
+
+    def start(self):
+        """Recover the log and start the background writer (inside the event loop)."""
+        self.recover()
+        db = SessionLocal()
+        try:
+            self.seed(db)
+        finally:
+            db.close()
+        self._wake = asyncio.Event()
+        self._writer = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval_ms / 1000.0)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Attendance writer failed: {str(e)}", exc_info=True)
+
+    async def stop(self):
+        """Stop the writer and write whatever is still pending."""
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            # Left in the log; written by recover() on the next start
+            logger.error(f"Could not write queued attendance on shutdown: {str(e)}")
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        left = False
+        for path in (self._flushing_path(), self.process_log_path):
+            if os.path.exists(path):
+                if os.path.getsize(path) == 0:
+                    os.remove(path)
+                else:
+                    left = True
+        if self._process_lock is not None:
+            # Unwritten events stay behind for the next process's recover()
+            if not left:
+                os.remove(self._process_lock.name)
+            self._process_lock.close()
+            self._process_lock = None
+
+
+# Shared by every request handled by this process; only used when
+# config.ATTENDANCE_WRITE_BEHIND is on
+attendance_queue = AttendanceWriteQueue(
+    config.ATTENDANCE_LOG_PATH, config.ATTENDANCE_FLUSH_INTERVAL_MS, config.ATTENDANCE_FLUSH_MAX_EVENTS
+)
+
+registry.register(Gauge("attendance_queue_pending", "Accepted attendance events not yet written",
+                        lambda: attendance_queue.pending))
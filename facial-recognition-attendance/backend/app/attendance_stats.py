@@ -0,0 +1,115 @@
+from calendar import monthrange
+from datetime import date
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from .models import AttendanceRecord, DailyAttendanceSummary, Student
+
+# Statuses that count as attending a day (late still attended)
+ATTENDED_STATUSES = ("present", "late")
+
+
+def month_grid(db: Session, year: int, month: int) -> dict:
+    """Per-day status counts for one month, one array entry per day."""
+    days_in_month = monthrange(year, month)[1]
+    first_day = date(year, month, 1)
+    last_day = date(year, month, days_in_month)
+
+    rows = db.execute(
+        select(DailyAttendanceSummary.date, DailyAttendanceSummary.status, func.sum(DailyAttendanceSummary.count))
+        .where(DailyAttendanceSummary.date >= first_day, DailyAttendanceSummary.date <= last_day)
+        .group_by(DailyAttendanceSummary.date, DailyAttendanceSummary.status)
+    ).all()
+
+    counts = {}
+    for day, status, count in rows:
+        if count:
+            counts.setdefault(status, [0] * days_in_month)[day.day - 1] = int(count)
+
+    return {
+        "month": first_day.strftime("%Y-%m"),
+        "days": days_in_month,
+        "total_students": db.query(Student).count(),
+        "counts": counts
+    }
+
+
+def student_stats(db: Session, from_date: date, to_date: date) -> dict:
+    """Attendance rate, late count and longest streak for every student.
+
+    Returned column-wise (parallel arrays ordered by student id) to keep the
+    payload small for thousands of students.
+    """
+    record = AttendanceRecord
+    in_range = (record.attendance_date >= from_date, record.attendance_date <= to_date)
+
+    # Days on which anyone was marked, numbered in order from the daily
+    # rollup; a streak is a run of consecutive school days, so weekends and
+    # holidays do not break it
+    summary = DailyAttendanceSummary
+    school_days = (
+        select(summary.date, func.row_number().over(order_by=summary.date).label("day_index"))
+        .where(summary.date >= from_date, summary.date <= to_date)
+        .group_by(summary.date)
+        .having(func.sum(summary.count) > 0)
+        .subquery()
+    )
+    total_days = db.execute(select(func.count()).select_from(school_days)).scalar()
+
+    counts = {
+        student_id: (int(attended or 0), int(late or 0))
+        for student_id, attended, late in db.execute(
+            select(
+                record.student_id,
+                func.sum(case((record.status.in_(ATTENDED_STATUSES), 1), else_=0)),
+                func.sum(case((record.status == "late", 1), else_=0))
+            )
+            .where(*in_range)
+            .group_by(record.student_id)
+        )
+    }
+
+    # Gaps and islands: within a run of consecutive school days the school
+    # day index and the student's own row number grow together, so their
+    # difference labels the run. Rows come off the (student_id,
+    # attendance_date, status) index already in window order.
+    attended = (
+        select(
+            record.student_id,
+            (school_days.c.day_index - func.row_number().over(
+                partition_by=record.student_id, order_by=record.attendance_date
+            )).label("island")
+        )
+        .join(school_days, school_days.c.date == record.attendance_date)
+        .where(*in_range, record.status.in_(ATTENDED_STATUSES))
+        .subquery()
+    )
+    runs = (
+        select(attended.c.student_id, func.count().label("length"))
+        .group_by(attended.c.student_id, attended.c.island)
+        .subquery()
+    )
+    streaks = dict(db.execute(
+        select(runs.c.student_id, func.max(runs.c.length)).group_by(runs.c.student_id)
+    ).all())
+
+    students = db.execute(select(Student.id, Student.full_name).order_by(Student.id)).all()
+    stats = {
+        "from": from_date.isoformat(),
+        "to": to_date.isoformat(),
+        "school_days": total_days,
+        "student_ids": [],
+        "names": [],
+        "attended": [],
+        "late": [],
+        "rate": [],
+        "longest_streak": []
+    }
+    for student_id, full_name in students:
+        attended_days, late_days = counts.get(student_id, (0, 0))
+        stats["student_ids"].append(student_id)
+        stats["names"].append(full_name)
+        stats["attended"].append(attended_days)
+        stats["late"].append(late_days)
+        stats["rate"].append(round(attended_days / total_days * 100, 2) if total_days else 0)
+        stats["longest_streak"].append(int(streaks.get(student_id, 0)))
+    return stats
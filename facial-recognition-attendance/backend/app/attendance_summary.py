@@ -0,0 +1,75 @@
+import logging
+from collections import Counter
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from .models import AttendanceRecord, DailyAttendanceSummary, attendance_day
+
+logger = logging.getLogger(__name__)
+
+# Dialects with INSERT ... ON CONFLICT support
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def count_by_day(rows) -> Counter:
+    """Count ``(timestamp, status)`` rows per ``(day, status)``."""
+    counts = Counter()
+    for timestamp, status in rows:
+        counts[(attendance_day(timestamp), status or "unknown")] += 1
+    return counts
+
+
+def adjust_summary(connection: Connection, deltas: dict):
+    """Apply per-(day, status) count changes to daily_attendance_summary."""
+    table = DailyAttendanceSummary.__table__
+    make_insert = UPSERT_INSERTS.get(connection.dialect.name)
+    for (day, status), delta in deltas.items():
+        if not delta:
+            continue
+        if make_insert is not None:
+            insert = make_insert(table).values(date=day, status=status, count=delta)
+            connection.execute(insert.on_conflict_do_update(
+                index_elements=[table.c.date, table.c.status],
+                set_={"count": table.c.count + delta},
+            ))
+            continue
+        result = connection.execute(
+            update(table)
+            .where(table.c.date == day, table.c.status == status)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(date=day, status=status, count=delta))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_attendance_changes(session: Session, flush_context):
+    # Keep the rollup in the same transaction as the attendance rows. Values
+    # are read from __dict__ so unloaded server defaults are never fetched
+    # mid-flush.
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, AttendanceRecord):
+            deltas[(attendance_day(obj.__dict__.get("timestamp")), obj.__dict__.get("status") or "unknown")] += 1
+    for obj in session.deleted:
+        if isinstance(obj, AttendanceRecord):
+            deltas[(attendance_day(obj.__dict__.get("timestamp")), obj.__dict__.get("status") or "unknown")] -= 1
+    if deltas:
+        adjust_summary(session.connection(), deltas)
+
+
+def rebuild_summary(db: Session) -> int:
+    """Recompute daily_attendance_summary from attendance_records; returns rows written."""
+    rows = db.query(AttendanceRecord.timestamp, AttendanceRecord.status).execution_options(
+        yield_per=10000
+    )
+    counts = count_by_day(rows)
+    db.query(DailyAttendanceSummary).delete(synchronize_session=False)
+    db.add_all([
+        DailyAttendanceSummary(date=day, status=status, count=count)
+        for (day, status), count in counts.items()
+    ])
+    db.commit()
+    logger.info(f"Rebuilt daily attendance summary: {len(counts)} rows")
+    return len(counts)
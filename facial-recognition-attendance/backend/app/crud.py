@@ -1,13 +1,28 @@
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from collections import Counter
+import base64
 from datetime import datetime, date, timedelta, timezone
-from typing import List
-import json
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from . import models, schemas
+from .gallery import gallery
+from .rosters import roster_index
+from .attendance_queue import attendance_queue
+from .face_codec import pack_encoding
+from .attendance_summary import UPSERT_INSERTS, adjust_summary, count_by_day
 
 # Define IST timezone offset (UTC+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+def _as_ist(timestamp: datetime) -> datetime:
+    # Stored times are IST wall times (SQLite drops the offset), and session
+    # windows are compared with the current IST time; naive means IST
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=IST)
+    return timestamp.astimezone(IST)
+
 def get_student(db: Session, student_id: int):
     return db.query(models.Student).filter(models.Student.id == student_id).first()
 
@@ -21,11 +36,13 @@ def create_student(db: Session, student: schemas.StudentCreate):
     db_student = models.Student(
         student_id=student.student_id,
         full_name=student.full_name,
-        face_encoding=json.dumps(student.face_encoding) if student.face_encoding else None
+        face_encoding=pack_encoding(student.face_encoding) if student.face_encoding else None
     )
     db.add(db_student)
     db.commit()
     db.refresh(db_student)
+    if student.face_encoding:
+        gallery.add(db_student.id, student.face_encoding)
     return db_student
 
 def delete_student(db: Session, student_id: int):
@@ -34,46 +51,150 @@ def delete_student(db: Session, student_id: int):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Delete associated attendance records first
-    db.query(models.AttendanceRecord).filter(
+    # Delete associated attendance records first; the bulk delete bypasses
+    # the session, so take them out of the daily summary explicitly
+    records = db.query(models.AttendanceRecord).filter(
         models.AttendanceRecord.student_id == student_id
-    ).delete(synchronize_session=False)
+    )
+    removed = count_by_day(records.with_entities(
+        models.AttendanceRecord.timestamp, models.AttendanceRecord.status
+    ))
+    adjust_summary(db.connection(), {key: -count for key, count in removed.items()})
+    records.delete(synchronize_session=False)
+    db.execute(models.section_students.delete().where(models.section_students.c.student_id == student_id))
     
     # Delete the student
     db.delete(student)
     db.commit()
+    gallery.remove(student_id)
+    roster_index.invalidate()
+    attendance_queue.forget(student_id)
     return {"message": f"Student {student.full_name} and all associated records deleted successfully"}
 
+def insert_attendance_once(db: Session, student_id: int, status: str, timestamp: datetime = None) -> Optional[models.AttendanceRecord]:
+    """Record a student's attendance unless they are already marked that day.
+
+    The unique (student_id, attendance_date) index turns the duplicate check
+    into the insert itself, so concurrent kiosks cannot both mark the same
+    student. Returns None when a record for that day already exists.
+    """
+    timestamp = _as_ist(timestamp) if timestamp else datetime.now(IST)
+    db_attendance = models.AttendanceRecord(
+        student_id=student_id,
+        status=status,
+        timestamp=timestamp,
+        attendance_date=models.attendance_day(timestamp)
+    )
+    db.add(db_attendance)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    db.refresh(db_attendance)
+    return db_attendance
+
+def insert_attendance_ignore_duplicates(db: Session, rows: List[dict]) -> dict:
+    """Insert many attendance rows in the current transaction, skipping duplicates.
+
+    Each row needs student_id, status and timestamp. Timestamps are stored
+    in IST, the zone attendance_date is counted in, so the stored time and
+    day agree whatever offset the caller used. Rows that collide with an
+    existing record for the same student and day (or with an earlier row in
+    ``rows``) are skipped. Returns {(student_id, attendance_date): id} for
+    the rows actually inserted; the caller commits.
+    """
+    if not rows:
+        return {}
+    table = models.AttendanceRecord.__table__
+    rows = [{**row, "timestamp": _as_ist(row["timestamp"])} for row in rows]
+    rows = [{**row, "attendance_date": models.attendance_day(row["timestamp"])} for row in rows]
+    inserted = {}
+    added = Counter()
+
+    make_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is not None:
+        statement = make_insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.student_id, table.c.attendance_date]
+        ).returning(table.c.id, table.c.student_id, table.c.attendance_date, table.c.status)
+        for record_id, student_id, day, status in db.execute(statement, rows):
+            inserted[(student_id, day)] = record_id
+            added[(day, status or "unknown")] += 1
+    else:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    result = db.execute(table.insert().values(**row))
+            except IntegrityError:
+                continue
+            inserted[(row["student_id"], row["attendance_date"])] = result.inserted_primary_key[0]
+            added[(row["attendance_date"], row["status"] or "unknown")] += 1
+
+    # Core inserts bypass the session's flush hook, so update the rollup here
+    adjust_summary(db.connection(), added)
+    return inserted
+
+def mark_attendance_bulk(db: Session, items: List[schemas.BulkAttendanceItem]) -> List[dict]:
+    """Mark many students in one transaction; returns one outcome per item, in order.
+
+    Outcomes: ``marked``, ``already_marked`` (a record exists for that
+    student and day), ``duplicate_in_request`` (an earlier item covers the
+    same student and day) or ``unknown_student``. Student ids are validated
+    with one IN query and existing same-day records found with one more,
+    then the new rows go in as a single ON CONFLICT DO NOTHING insert.
+    """
+    now = datetime.now(IST)
+    keyed = [(item, _as_ist(item.timestamp) if item.timestamp else now) for item in items]
+    keyed = [(item, timestamp, models.attendance_day(timestamp)) for item, timestamp in keyed]
+    student_ids = {item.student_id for item in items}
+    days = {day for _, _, day in keyed}
+
+    known = set(db.scalars(select(models.Student.id).where(models.Student.id.in_(student_ids))))
+    record = models.AttendanceRecord
+    already = set(db.execute(
+        select(record.student_id, record.attendance_date)
+        .where(record.student_id.in_(known), record.attendance_date.in_(days))
+    ).all()) if known else set()
+
+    outcomes = []
+    to_insert = {}
+    for index, (item, timestamp, day) in enumerate(keyed):
+        key = (item.student_id, day)
+        outcome = {"index": index, "student_id": item.student_id, "attendance_date": day, "record_id": None}
+        if item.student_id not in known:
+            outcome["outcome"] = "unknown_student"
+        elif key in already:
+            outcome["outcome"] = "already_marked"
+        elif key in to_insert:
+            outcome["outcome"] = "duplicate_in_request"
+        else:
+            to_insert[key] = {"student_id": item.student_id, "status": item.status, "timestamp": timestamp}
+            outcome["outcome"] = "marked"
+        outcomes.append(outcome)
+
+    inserted = insert_attendance_ignore_duplicates(db, list(to_insert.values()))
+    db.commit()
+
+    for outcome in outcomes:
+        if outcome["outcome"] == "marked":
+            record_id = inserted.get((outcome["student_id"], outcome["attendance_date"]))
+            if record_id is None:
+                # Marked concurrently between the duplicate check and the insert
+                outcome["outcome"] = "already_marked"
+            else:
+                outcome["record_id"] = record_id
+    return outcomes
+
 def create_attendance_record(db: Session, attendance: schemas.AttendanceRecordCreate):
     # Check if student exists
     student = db.query(models.Student).filter(models.Student.id == attendance.student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get current time in IST
-    current_time = datetime.now(IST)
-    today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
-    
-    # Check if attendance already marked for today
-    existing_attendance = db.query(models.AttendanceRecord).filter(
-        models.AttendanceRecord.student_id == attendance.student_id,
-        models.AttendanceRecord.timestamp >= today_start,
-        models.AttendanceRecord.timestamp < today_end
-    ).first()
-    
-    if existing_attendance:
+    # Create new attendance record with IST timestamp, unless already marked for today
+    db_attendance = insert_attendance_once(db, attendance.student_id, attendance.status)
+    if db_attendance is None:
         raise HTTPException(status_code=400, detail="Attendance already marked for today")
-    
-    # Create new attendance record with IST timestamp
-    db_attendance = models.AttendanceRecord(
-        student_id=attendance.student_id,
-        status=attendance.status,
-        timestamp=current_time
-    )
-    db.add(db_attendance)
-    db.commit()
-    db.refresh(db_attendance)
     return db_attendance
 
 def get_attendance_records(db: Session, student_id: int, skip: int = 0, limit: int = 100):
@@ -81,7 +202,125 @@ def get_attendance_records(db: Session, student_id: int, skip: int = 0, limit: i
         models.AttendanceRecord.student_id == student_id
     ).offset(skip).limit(limit).all()
 
+def encode_attendance_cursor(key: Tuple[datetime, int]) -> str:
+    """Opaque cursor for a (timestamp, id) keyset position."""
+    timestamp, record_id = key
+    raw = f"{timestamp.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_attendance_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_attendance_cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def get_attendance_page(
+    db: Session,
+    from_date: date = None,
+    to_date: date = None,
+    student_id: int = None,
+    status: str = None,
+    after: Tuple[datetime, int] = None,
+    limit: int = 100
+) -> Tuple[List[models.AttendanceRecord], Optional[Tuple[datetime, int]]]:
+    """One page of attendance records in (timestamp, id) order.
+
+    Keyset pagination: ``after`` is the (timestamp, id) of the last record of
+    the previous page, so each page is an index range scan however deep it
+    is, unlike OFFSET. Dates are inclusive IST calendar days. Returns the
+    records and the key for the next page, or None on the last page.
+    """
+    record = models.AttendanceRecord
+    query = db.query(record)
+    if from_date is not None:
+        query = query.filter(record.timestamp >= datetime.combine(from_date, datetime.min.time(), IST))
+    if to_date is not None:
+        query = query.filter(record.timestamp < datetime.combine(to_date + timedelta(days=1), datetime.min.time(), IST))
+    if student_id is not None:
+        query = query.filter(record.student_id == student_id)
+    if status is not None:
+        query = query.filter(record.status == status)
+    if after is not None:
+        query = query.filter(tuple_(record.timestamp, record.id) > tuple_(*after))
+
+    # Fetch one extra row to learn whether another page follows
+    records = query.order_by(record.timestamp, record.id).limit(limit + 1).all()
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    return records, (records[-1].timestamp, records[-1].id)
+
 def get_user_attendance(db: Session, user_id: int):
     return db.query(models.AttendanceRecord).filter(
         models.AttendanceRecord.student_id == user_id
-    ).all() 
\ No newline at end of file
+    ).all()
+
+def create_course(db: Session, course: schemas.CourseCreate):
+    db_course = models.Course(code=course.code, name=course.name)
+    db.add(db_course)
+    db.commit()
+    db.refresh(db_course)
+    return db_course
+
+def get_course_by_code(db: Session, code: str):
+    return db.query(models.Course).filter(models.Course.code == code).first()
+
+def get_courses(db: Session):
+    return db.query(models.Course).order_by(models.Course.code).all()
+
+def create_section(db: Session, course_id: int, section: schemas.SectionCreate):
+    if db.get(models.Course, course_id) is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    db_section = models.Section(course_id=course_id, name=section.name)
+    db.add(db_section)
+    db.commit()
+    db.refresh(db_section)
+    return db_section
+
+def get_section(db: Session, section_id: int) -> models.Section:
+    db_section = db.get(models.Section, section_id)
+    if db_section is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    return db_section
+
+def set_section_roster(db: Session, section_id: int, student_ids: List[int]) -> int:
+    """Replace a section's roster; returns the number of students on it."""
+    get_section(db, section_id)
+    student_ids = set(student_ids)
+    known = set(db.scalars(select(models.Student.id).where(models.Student.id.in_(student_ids))))
+    if known != student_ids:
+        missing = sorted(student_ids - known)
+        raise HTTPException(status_code=404, detail=f"Students not found: {missing}")
+    roster = models.section_students
+    db.execute(roster.delete().where(roster.c.section_id == section_id))
+    if student_ids:
+        db.execute(roster.insert(), [
+            {"section_id": section_id, "student_id": student_id} for student_id in sorted(student_ids)
+        ])
+    db.commit()
+    roster_index.invalidate()
+    return len(student_ids)
+
+def create_class_session(db: Session, section_id: int, class_session: schemas.ClassSessionCreate):
+    get_section(db, section_id)
+    starts_at, ends_at = _as_ist(class_session.starts_at), _as_ist(class_session.ends_at)
+    if ends_at <= starts_at:
+        raise HTTPException(status_code=400, detail="Session must end after it starts")
+    db_session = models.ClassSession(
+        section_id=section_id,
+        kiosk_id=class_session.kiosk_id,
+        starts_at=starts_at,
+        ends_at=ends_at
+    )
+    db.add(db_session)
+    db.commit()
+    db.refresh(db_session)
+    return db_session
+
+def get_class_sessions(db: Session, section_id: int):
+    return db.query(models.ClassSession).filter(
+        models.ClassSession.section_id == section_id
+    ).order_by(models.ClassSession.starts_at).all()
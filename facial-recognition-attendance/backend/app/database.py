@@ -1,12 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from . import config
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # Applied to every new SQLite connection: WAL lets readers run alongside
+    # the single writer, and busy_timeout makes writers wait for the lock
+    # instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    # The journal mode is stored in the database file, so only the first
+    # connection switches it; re-issuing it needs an exclusive lock that
+    # would fail while another connection is mid-write
+    current_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+    if current_mode.upper() != config.SQLITE_JOURNAL_MODE.upper():
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL, tune_sqlite: bool = True) -> Engine:
+    """Create the engine for ``url`` with pooling/tuning from config."""
+    if url.startswith("sqlite"):
+        in_memory = url in ("sqlite://", "sqlite:///:memory:")
+        pool_options = {} if in_memory else {
+            "pool_size": config.DB_POOL_SIZE,
+            "max_overflow": config.DB_MAX_OVERFLOW,
+            "pool_timeout": config.DB_POOL_TIMEOUT,
+        }
+        engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            },
+            **pool_options,
+        )
+        if tune_sqlite and not in_memory:
+            event.listen(engine, "connect", _sqlite_pragmas)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+
+def database_url(target: str) -> str:
+    """``target`` as a database URL; a bare path means a SQLite file."""
+    return target if "://" in target else f"sqlite:///{target}"
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -21,4 +75,4 @@ def get_db():
 
 # Create tables
 def create_tables():
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
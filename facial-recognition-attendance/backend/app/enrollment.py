@@ -0,0 +1,291 @@
+"""Bulk student enrollment from a roster CSV and a ZIP or directory of photos.
+
+The roster needs ``student_id`` and ``full_name`` columns and may name each
+student's image in a ``photo`` column; otherwise ``<student_id>.jpg`` (or
+.jpeg/.png) is looked up. Used by ``POST /api/students/bulk`` and from the
+command line (backend directory):
+
+    python -m app.enrollment roster.csv photos.zip
+    python -m app.enrollment roster.csv photos/ --workers 8
+
+A running server loads students enrolled from the command line into its
+gallery on the next restart.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import Student
+from .face_codec import pack_encoding
+from .face_pipeline import encode_single_face, init_worker
+from .executor import FaceWorkerPool, PoolSaturatedError, available_cores
+from .gallery import gallery
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+INSERT_BATCH_SIZE = 500
+
+
+class RosterEntry(NamedTuple):
+    row: int  # line number in the CSV, header is line 1
+    student_id: str
+    full_name: str
+    photo: str
+
+
+class EnrollmentReport:
+    def __init__(self):
+        self.total_rows = 0
+        self.enrolled = 0
+        self.failed = []
+
+    def fail(self, row: int, student_id: Optional[str], error: str):
+        self.failed.append({"row": row, "student_id": student_id, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "total_rows": self.total_rows,
+            "enrolled": self.enrolled,
+            "failed": sorted(self.failed, key=lambda failure: failure["row"])
+        }
+
+
+def parse_roster(text: str, report: EnrollmentReport) -> List[RosterEntry]:
+    """Valid roster rows; bad rows and repeated student_ids are reported."""
+    reader = csv.DictReader(io.StringIO(text))
+    fields = {name.strip().lower() for name in reader.fieldnames or []}
+    if not {"student_id", "full_name"} <= fields:
+        raise ValueError("Roster CSV needs 'student_id' and 'full_name' columns")
+
+    entries = []
+    seen = set()
+    for row in reader:
+        row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+        report.total_rows += 1
+        line = reader.line_num
+        student_id, full_name = row.get("student_id", ""), row.get("full_name", "")
+        if not student_id or not full_name:
+            report.fail(line, student_id or None, "student_id and full_name are required")
+        elif student_id in seen:
+            report.fail(line, student_id, "Duplicate student_id in roster")
+        else:
+            seen.add(student_id)
+            entries.append(RosterEntry(line, student_id, full_name, row.get("photo", "")))
+    return entries
+
+
+class PhotoSource:
+    """Photos from a ZIP archive or a directory, found by file name or stem.
+
+    Images are read one at a time when their encoding job is submitted.
+    """
+
+    def __init__(self, source):
+        self._zip = None
+        self._directory = None
+        self._names = {}
+        if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+            self._directory = source
+            paths = [
+                os.path.relpath(os.path.join(root, name), source)
+                for root, _, files in os.walk(source) for name in files
+            ]
+        else:
+            self._zip = zipfile.ZipFile(source)
+            paths = [
+                info.filename for info in self._zip.infolist()
+                if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+            ]
+        for path in paths:
+            name = os.path.basename(path).lower()
+            stem, extension = os.path.splitext(name)
+            if extension in PHOTO_EXTENSIONS:
+                self._names.setdefault(name, path)
+                self._names.setdefault(stem, path)
+
+    def find(self, entry: RosterEntry) -> Optional[str]:
+        key = os.path.basename(entry.photo or entry.student_id).lower()
+        return self._names.get(key)
+
+    def read(self, path: str) -> bytes:
+        if self._zip is not None:
+            return self._zip.read(path)
+        with open(os.path.join(self._directory, path), "rb") as photo:
+            return photo.read()
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+def plan_enrollment(db: Session, entries: List[RosterEntry], photos: PhotoSource,
+                    report: EnrollmentReport) -> List[Tuple[RosterEntry, str]]:
+    """Entries to encode with their photo path, minus already-registered ids."""
+    # One query for every registered id, then set lookups per row
+    registered = set(db.scalars(select(Student.student_id)))
+    jobs = []
+    for entry in entries:
+        if entry.student_id in registered:
+            report.fail(entry.row, entry.student_id, "Student ID already registered")
+            continue
+        path = photos.find(entry)
+        if path is None:
+            report.fail(entry.row, entry.student_id, f"No photo found for '{entry.photo or entry.student_id}'")
+            continue
+        jobs.append((entry, path))
+    return jobs
+
+
+def encoding_error(result: dict) -> Optional[str]:
+    """Why an encode_single_face result cannot be enrolled, if it cannot."""
+    if result["face_count"] == 0:
+        return "No face detected in the photo"
+    if result["face_count"] > 1:
+        return "Multiple faces detected in the photo"
+    if result["encoding"] is None:
+        return "Could not encode the face"
+    return None
+
+
+def _insert_batch(db: Session, batch: List[Tuple[RosterEntry, list]], report: EnrollmentReport) -> Dict[int, list]:
+    rows = [
+        {"student_id": entry.student_id, "full_name": entry.full_name, "face_encoding": pack_encoding(encoding)}
+        for entry, encoding in batch
+    ]
+    try:
+        inserted = db.execute(insert(Student).returning(Student.id, Student.student_id), rows).all()
+        db.commit()
+    except IntegrityError:
+        # Someone registered one of these ids meanwhile; retry row by row
+        db.rollback()
+        inserted = []
+        for row, (entry, _) in zip(rows, batch):
+            try:
+                with db.begin_nested():
+                    inserted.append((db.execute(insert(Student).returning(Student.id), row).scalar_one(), entry.student_id))
+            except IntegrityError:
+                report.fail(entry.row, entry.student_id, "Student ID already registered")
+        db.commit()
+    encodings = {entry.student_id: encoding for entry, encoding in batch}
+    return {student_pk: encodings[student_id] for student_pk, student_id in inserted}
+
+
+def store_enrollments(db: Session, encoded: List[Tuple[RosterEntry, list]], report: EnrollmentReport,
+                      batch_size: int = INSERT_BATCH_SIZE):
+    """Insert encoded students in batched transactions, then update the gallery once."""
+    enrolled = {}
+    for start in range(0, len(encoded), batch_size):
+        enrolled.update(_insert_batch(db, encoded[start:start + batch_size], report))
+    gallery.add_many(list(enrolled.keys()), list(enrolled.values()))
+    report.enrolled += len(enrolled)
+    logger.info(f"Bulk enrolled {len(enrolled)} students")
+
+
+def _record_encoding(entry: RosterEntry, result: dict, encoded: list, report: EnrollmentReport):
+    error = encoding_error(result)
+    if error:
+        report.fail(entry.row, entry.student_id, error)
+    else:
+        encoded.append((entry, result["encoding"].tolist()))
+
+
+def encode_in_processes(jobs: List[Tuple[RosterEntry, str]], photos: PhotoSource, workers: int,
+                        report: EnrollmentReport) -> List[Tuple[RosterEntry, list]]:
+    """CLI path: encode photos across ``workers`` processes, keeping a bounded window in flight."""
+    encoded = []
+    pending = {}
+    queue = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker) as executor:
+        while True:
+            while len(pending) < workers * 2:
+                job = next(queue, None)
+                if job is None:
+                    break
+                entry, path = job
+                pending[executor.submit(encode_single_face, photos.read(path))] = entry
+            if not pending:
+                return encoded
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    report.fail(entry.row, entry.student_id, f"Could not process photo: {str(e)}")
+                    continue
+                _record_encoding(entry, result, encoded, report)
+
+
+async def encode_with_pool(pool: FaceWorkerPool, jobs: List[Tuple[RosterEntry, str]], photos: PhotoSource,
+                           report: EnrollmentReport) -> List[Tuple[RosterEntry, list]]:
+    """API path: encode on the shared face worker pool.
+
+    At most one job per worker is in flight, so kiosks keep their queue
+    slots while an intake is imported; a full queue is waited out rather
+    than failing rows.
+    """
+    slots = asyncio.Semaphore(pool.max_workers)
+    encoded = []
+
+    async def encode(entry: RosterEntry, path: str):
+        async with slots:
+            image_data = None
+            while True:
+                try:
+                    if image_data is None:
+                        # ZIP member reads (and inflation) off the event loop
+                        image_data = await asyncio.to_thread(photos.read, path)
+                    result, _ = await pool.run(encode_single_face, image_data)
+                    break
+                except PoolSaturatedError:
+                    await asyncio.sleep(0.05)
+                except Exception as e:
+                    report.fail(entry.row, entry.student_id, f"Could not process photo: {str(e)}")
+                    return
+        _record_encoding(entry, result, encoded, report)
+
+    await asyncio.gather(*(encode(entry, path) for entry, path in jobs))
+    return encoded
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roster", help="CSV with student_id, full_name and optional photo columns")
+    parser.add_argument("photos", help="ZIP archive or directory of photos")
+    parser.add_argument("--workers", type=int, default=available_cores())
+    args = parser.parse_args(argv)
+
+    report = EnrollmentReport()
+    with open(args.roster, encoding="utf-8-sig") as roster:
+        entries = parse_roster(roster.read(), report)
+    photos = PhotoSource(args.photos)
+    db = SessionLocal()
+    try:
+        jobs = plan_enrollment(db, entries, photos, report)
+        encoded = encode_in_processes(jobs, photos, args.workers, report)
+        store_enrollments(db, encoded, report)
+    finally:
+        db.close()
+        photos.close()
+
+    summary = report.as_dict()
+    print(f"Enrolled {summary['enrolled']} of {summary['total_rows']} students")
+    for failure in summary["failed"]:
+        print(f"  row {failure['row']} ({failure['student_id']}): {failure['error']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
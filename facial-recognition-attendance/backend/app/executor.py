@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from . import config
+from .face_pipeline import init_worker
+from .metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    pass
+
+
+def _timed_call(fn, args):
+    # Runs in the worker: report when the job actually started
+    return time.time(), fn(*args)
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class FaceWorkerPool:
+    """Bounded process pool for CPU-bound face detection and encoding.
+
+    Jobs run in separate processes so dlib never blocks the event loop. At
+    most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+    wait; beyond that ``run`` raises ``PoolSaturatedError`` immediately so
+    the caller can shed load (HTTP 503) instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int = 0, max_queue: int = 0):
+        self.max_workers = max_workers or available_cores()
+        self.max_queue = max_queue
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs server threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                )
+                logger.info(f"Started face worker pool with {self.max_workers} processes")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                POOL_REJECTIONS.inc()
+                raise PoolSaturatedError(
+                    f"Face processing queue is full ({self._pending} jobs pending)"
+                )
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in a worker; returns ``(result, queue_ms)``.
+
+        ``queue_ms`` is the time from submission until a worker picked the
+        job up.
+        """
+        self._reserve()
+        try:
+            self.start()
+            submitted = time.time()
+            future = self._executor.submit(_timed_call, fn, args)
+            started, result = await asyncio.wrap_future(future)
+            return result, max(0.0, (started - submitted) * 1000.0)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory in dlib); start a fresh pool next time
+            logger.error("Face worker pool is broken, restarting it")
+            self.shutdown()
+            raise
+        finally:
+            self._release()
+
+
+POOL_REJECTIONS = registry.register(Counter(
+    "face_pool_rejections_total", "Face jobs refused because the worker queue was full (HTTP 503)"
+))
+
+face_pool = FaceWorkerPool(config.FACE_WORKERS, config.FACE_QUEUE_DEPTH)
+
+registry.register(Gauge("face_pool_pending_jobs", "Face jobs running or queued", lambda: face_pool.pending))
@@ -0,0 +1,300 @@
+import logging
+import time
+from typing import List, NamedTuple
+import numpy as np
+from . import config
+from .image_ingest import ImageDecodeError, ingest_image, read_header
+
+# CPU-bound face detection/encoding steps. These functions run inside the
+# worker processes of executor.face_pool, so they take raw image bytes and
+# return plain picklable results with per-stage timings in milliseconds.
+
+logger = logging.getLogger(__name__)
+
+# OpenCV, PIL and face_recognition/dlib are imported on first use, so the
+# API process (which only hands images to the workers) starts without them
+cv2 = None
+Image = None
+face_recognition = None
+
+
+class DetectionStage(NamedTuple):
+    """One attempt of the adaptive detection pipeline.
+
+    Detection runs on a copy downscaled so its longer side is at most
+    ``max_side`` pixels (0 = full resolution); boxes are mapped back to the
+    full-resolution image for encoding. The stage is skipped when less than
+    ``budget_ms`` of the pipeline's total budget remains.
+    """
+    model: str
+    max_side: int
+    upsample: int
+    budget_ms: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}_{self.max_side or 'full'}_u{self.upsample}"
+
+
+def parse_detection_stages(spec: str) -> List[DetectionStage]:
+    """Parse "model:max_side:upsample:budget_ms,..." into stages."""
+    stages = []
+    for item in spec.split(","):
+        model, max_side, upsample, budget_ms = item.strip().split(":")
+        if model not in ("hog", "cnn"):
+            raise ValueError(f"Unknown face detection model '{model}'")
+        stages.append(DetectionStage(model, int(max_side), int(upsample), float(budget_ms)))
+    return stages
+
+
+DETECTION_STAGES = parse_detection_stages(config.FACE_DETECTION_STAGES)
+# Group photos: faces are small, so always full resolution with 2x upsampling
+GROUP_DETECTION_STAGE = DetectionStage("hog", 0, 2, 0)
+
+
+def import_image_libraries():
+    """Import OpenCV and PIL (once)."""
+    global cv2, Image
+    if cv2 is None:
+        import cv2 as cv2_module
+        from PIL import Image as image_module
+        cv2, Image = cv2_module, image_module
+
+
+def init_worker():
+    """Process-pool initializer: load the dlib models once per worker."""
+    global face_recognition
+    import_image_libraries()
+    import face_recognition as face_recognition_module
+    face_recognition = face_recognition_module
+    # The first call pays for lazy dlib setup; do it before serving requests
+    face_recognition.face_locations(np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def _ensure_models():
+    if face_recognition is None:
+        init_worker()
+
+
+class _StageTimer:
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last) * 1000.0
+        self._last = now
+
+
+def decode_image(image_data) -> np.ndarray:
+    """Decode JPEG/PNG bytes (or any buffer) to an upright RGB uint8 array.
+
+    The working resolution is capped at ``config.IMAGE_MAX_SIDE``, see
+    image_ingest.
+    """
+    import_image_libraries()
+    return ingest_image(image_data, config.IMAGE_MAX_SIDE)
+
+
+def _load_image(image_data: bytes, timer: _StageTimer) -> np.ndarray:
+    import_image_libraries()
+    return ingest_image(image_data, config.IMAGE_MAX_SIDE, timer.lap)
+
+
+def encode_single_face(image_data: bytes) -> dict:
+    """Registration path: exactly one face must be found and encoded."""
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(image_data, timer)
+
+    face_locations = face_recognition.face_locations(image_array, model="hog", number_of_times_to_upsample=2)
+    timer.lap("detect")
+
+    encoding = None
+    if len(face_locations) == 1:
+        face_encodings = face_recognition.face_encodings(image_array, face_locations)
+        timer.lap("encode")
+        if face_encodings:
+            encoding = face_encodings[0]
+
+    return {"face_count": len(face_locations), "encoding": encoding, "timings": timer.timings}
+
+
+def _detect_scaled(image_array: np.ndarray, stage: DetectionStage, scaled_cache: dict):
+    """Run one stage's detector, returning boxes in full-resolution coordinates."""
+    height, width = image_array.shape[:2]
+    scale = 1.0
+    if stage.max_side and max(height, width) > stage.max_side:
+        scale = stage.max_side / max(height, width)
+    if scale == 1.0:
+        detect_array = image_array
+    else:
+        # Stages sharing a working size share one downscaled copy
+        detect_array = scaled_cache.get(stage.max_side)
+        if detect_array is None:
+            detect_array = cv2.resize(
+                image_array, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA
+            )
+            scaled_cache[stage.max_side] = detect_array
+
+    locations = face_recognition.face_locations(
+        detect_array, model=stage.model, number_of_times_to_upsample=stage.upsample
+    )
+    if scale == 1.0:
+        return locations
+    return [
+        (
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale)),
+        )
+        for top, right, bottom, left in locations
+    ]
+
+
+def detect_faces(image_array: np.ndarray, timer: _StageTimer, stages: List[DetectionStage] = None,
+                 budget_ms: float = None):
+    """Adaptive detection: cheap stages first, escalating only when they find nothing.
+
+    Returns ``(locations, stage_name)``; ``stage_name`` is ``None`` when every
+    stage failed or was skipped for lack of budget.
+    """
+    stages = DETECTION_STAGES if stages is None else stages
+    budget_ms = config.FACE_DETECTION_BUDGET_MS if budget_ms is None else budget_ms
+    started = time.perf_counter()
+    scaled_cache = {}
+    for stage in stages:
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if budget_ms - elapsed_ms < stage.budget_ms:
+            logger.debug(f"Skipping detection stage {stage.name}: {elapsed_ms:.0f} ms of budget used")
+            continue
+        try:
+            locations = _detect_scaled(image_array, stage, scaled_cache)
+        except Exception as e:
+            logger.warning(f"Detection stage {stage.name} failed: {str(e)}")
+            locations = []
+        timer.lap(f"detect_{stage.name}")
+        if locations:
+            return locations, stage.name
+    return [], None
+
+
+def encode_probe_face(image_data: bytes) -> dict:
+    """Recognition path: find the most likely face and encode it, leniently."""
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(image_data, timer)
+
+    # Resize the image if it's too small
+    if image_array.shape[0] < 300 or image_array.shape[1] < 300:
+        scale_factor = max(300 / image_array.shape[0], 300 / image_array.shape[1])
+        new_size = (int(image_array.shape[1] * scale_factor), int(image_array.shape[0] * scale_factor))
+        image_array = cv2.resize(image_array, new_size)
+        timer.lap("resize")
+
+    face_locations, detector = detect_faces(image_array, timer)
+
+    if face_locations:
+        # Only the largest face (the person nearest the camera) is encoded
+        largest = max(face_locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+        face_locations = [largest]
+    else:
+        # If no faces, use a more lenient approach by assuming the entire image is a face
+        height, width = image_array.shape[:2]
+        face_locations = [(0, width, height, 0)]  # top, right, bottom, left format
+        detector = "full_frame"
+
+    face_encodings = face_recognition.face_encodings(image_array, face_locations)
+    if not face_encodings:
+        # Try with jitter which helps with different lighting conditions
+        face_encodings = face_recognition.face_encodings(image_array, face_locations, num_jitters=3)
+    timer.lap("encode")
+
+    return {
+        "encoding": face_encodings[0] if face_encodings else None,
+        "detector": detector,
+        "location": face_locations[0],
+        "timings": timer.timings,
+    }
+
+
+def encode_all_faces(image_data: bytes) -> dict:
+    """Group-photo path: every detected face with its bounding box.
+
+    ``detector`` is the detection stage that found the faces (None if none).
+    """
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(image_data, timer)
+
+    stage = GROUP_DETECTION_STAGE
+    face_locations = face_recognition.face_locations(
+        image_array, model=stage.model, number_of_times_to_upsample=stage.upsample
+    )
+    timer.lap("detect")
+    face_encodings = face_recognition.face_encodings(image_array, face_locations)
+    timer.lap("encode")
+
+    return {
+        "locations": _to_upload_coordinates(image_data, image_array, face_locations),
+        "encodings": face_encodings,
+        "detector": stage.name if face_locations else None,
+        "timings": timer.timings,
+    }
+
+
+def _to_upload_coordinates(image_data: bytes, image_array: np.ndarray, locations: list) -> list:
+    """Map boxes found in the capped working image back to the (upright) uploaded size."""
+    _, size, _ = read_header(image_data)
+    if not size or not locations:
+        return locations
+    scale = max(size) / max(image_array.shape[:2])
+    if scale == 1.0:
+        return locations
+    return [tuple(int(round(value * scale)) for value in box) for box in locations]
+
+
+def detect_stream_faces(image_data: bytes) -> dict:
+    """Video-stream path: face boxes only, from the cheapest detection stage.
+
+    Stream frames keep coming, so a frame without a face is not worth
+    escalating to the slower stages; the next detection gets another try.
+    """
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(image_data, timer)
+    locations, detector = detect_faces(image_array, timer, DETECTION_STAGES[:1])
+    return {"locations": locations, "detector": detector, "timings": timer.timings}
+
+
+def encode_faces_at(image_data: bytes, locations: list) -> dict:
+    """Encode the faces at known boxes (new tracks of a video stream)."""
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(image_data, timer)
+    face_encodings = face_recognition.face_encodings(image_array, locations)
+    timer.lap("encode")
+    return {"encodings": face_encodings, "timings": timer.timings}
+
+
+def blank_jpeg(width: int = 320, height: int = 240) -> bytes:
+    """A plain gray JPEG, for exercising the pipeline without a real photo."""
+    import_image_libraries()
+    return cv2.imencode(".jpg", np.full((height, width, 3), 128, dtype=np.uint8))[1].tobytes()
+
+
+def warm_up() -> dict:
+    """Run one throwaway detect + encode so a worker's first real job is not slow.
+
+    Loads the detection, landmark and encoding models and pays dlib's
+    first-call overhead; no face needs to be found.
+    """
+    _ensure_models()
+    timer = _StageTimer()
+    image_array = _load_image(blank_jpeg(), timer)
+    detect_faces(image_array, timer, DETECTION_STAGES[:1])
+    face_recognition.face_encodings(image_array, [(60, 220, 180, 100)])
+    timer.lap("encode")
+    return {"timings": timer.timings}
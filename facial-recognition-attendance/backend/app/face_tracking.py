@@ -0,0 +1,85 @@
+from itertools import count
+from typing import List, Optional, Tuple
+
+# Face boxes use face_recognition's (top, right, bottom, left) order
+Box = Tuple[int, int, int, int]
+
+
+def iou(a: Box, b: Box) -> float:
+    """Intersection over union of two boxes."""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class Track:
+    """One face followed across detections of a video stream."""
+
+    def __init__(self, track_id: int, box: Box, frame: int):
+        self.track_id = track_id
+        self.box = box
+        self.first_frame = frame
+        self.last_frame = frame
+        self.missed = 0
+        # Set once the face has been encoded and matched (or found unknown)
+        self.identified = False
+        self.match: Optional[dict] = None
+
+
+class IoUTracker:
+    """Follows faces between detections by greedy IoU box matching.
+
+    A kiosk camera sees a few slow-moving faces, so boxes from consecutive
+    detections of the same person overlap heavily; no motion model or
+    appearance features are needed. A track is dropped after going
+    undetected ``max_missed`` detections in a row.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks: List[Track] = []
+        self._ids = count(1)
+
+    def update(self, boxes: List[Box], frame: int) -> List[Track]:
+        """Assign detected ``boxes`` to tracks; returns the tracks seen in this frame."""
+        pairs = sorted(
+            (
+                (iou(track.box, box), track_index, box_index)
+                for track_index, track in enumerate(self.tracks)
+                for box_index, box in enumerate(boxes)
+            ),
+            reverse=True,
+        )
+        matched_tracks = set()
+        matched_boxes = {}
+        for overlap, track_index, box_index in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if track_index in matched_tracks or box_index in matched_boxes:
+                continue
+            matched_tracks.add(track_index)
+            matched_boxes[box_index] = self.tracks[track_index]
+
+        current = []
+        for box_index, box in enumerate(boxes):
+            track = matched_boxes.get(box_index)
+            if track is None:
+                track = Track(next(self._ids), box, frame)
+                self.tracks.append(track)
+            else:
+                track.box = box
+                track.last_frame = frame
+                track.missed = 0
+            current.append(track)
+
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matched_tracks and track.last_frame != frame:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return current
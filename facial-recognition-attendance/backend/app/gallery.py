@@ -0,0 +1,127 @@
+import logging
+import numpy as np
+from sqlalchemy.orm import Session
+from .models import Student
+from .face_codec import unpack_encoding
+from .matching import Matcher, create_matcher
+from .metrics import Gauge, registry
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# dlib face encodings are always 128-dimensional
+ENCODING_DIM = 128
+
+
+def default_matcher(dim: int = ENCODING_DIM) -> Matcher:
+    if config.FACE_MATCHER == "ivf":
+        return create_matcher(
+            "ivf", dim,
+            n_lists=config.IVF_LISTS,
+            n_probe=config.IVF_PROBES,
+            min_train_size=config.IVF_MIN_TRAIN_SIZE,
+        )
+    if config.FACE_MATCHER == "exact" and config.GALLERY_PRECISION != "float32":
+        return create_matcher(
+            "quantized", dim,
+            precision=config.GALLERY_PRECISION,
+            rerank=config.GALLERY_RERANK,
+        )
+    if config.FACE_MATCHER == "shared":
+        from .shared_gallery import SharedMatcher
+        return SharedMatcher(dim, config.GALLERY_SHARED_DIR)
+    return create_matcher(config.FACE_MATCHER, dim)
+
+
+class FaceGallery:
+    """Process-wide store of enrolled face encodings.
+
+    Encodings are kept in memory as float32 vectors keyed by ``Student.id``
+    and searched through a pluggable ``Matcher`` (exact brute force by
+    default, see ``config.FACE_MATCHER``), so a probe is matched against
+    every student without touching the database.
+    """
+
+    def __init__(self, matcher: Matcher = None, dim: int = ENCODING_DIM):
+        self.dim = dim
+        self.matcher = matcher if matcher is not None else default_matcher(dim)
+        self._changes = 0
+
+    @property
+    def generation(self) -> int:
+        """Moves on with every change, so results derived from an older
+        gallery (e.g. the recognition cache) can tell they are stale.
+
+        Includes changes other server workers made to a shared gallery.
+        """
+        return self._changes + self.matcher.version
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def load(self, db: Session):
+        """Rebuild the gallery from every student that has a face encoding."""
+        rows = db.query(Student.id, Student.face_encoding).filter(
+            Student.face_encoding.isnot(None)
+        ).all()
+
+        ids = []
+        vectors = []
+        for student_id, face_encoding in rows:
+            try:
+                vector = unpack_encoding(face_encoding)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Error decoding face encoding for student {student_id}: {str(e)}")
+                continue
+            if vector.shape != (self.dim,):
+                logger.error(f"Skipping student {student_id}: encoding shape {vector.shape}")
+                continue
+            ids.append(student_id)
+            vectors.append(vector)
+
+        if vectors:
+            self.matcher.build(np.asarray(ids, dtype=np.int64), np.stack(vectors))
+        else:
+            self.matcher.clear()
+        self._changes += 1
+        logger.info(f"Loaded {len(ids)} face encodings into the gallery ({self.matcher.name} matcher)")
+
+    def add(self, student_id: int, encoding):
+        """Insert or replace the encoding for one student."""
+        self.matcher.add(student_id, np.asarray(encoding, dtype=np.float32).reshape(self.dim))
+        self._changes += 1
+
+    def add_many(self, student_ids, encodings):
+        """Insert or replace many encodings in one index update (bulk enrollment)."""
+        if len(student_ids):
+            self.matcher.add_many(
+                np.asarray(student_ids, dtype=np.int64),
+                np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+            )
+            self._changes += 1
+
+    def remove(self, student_id: int):
+        self.matcher.remove(student_id)
+        self._changes += 1
+
+    def clear(self):
+        self.matcher.clear()
+        self._changes += 1
+
+    def search(self, probes, k: int = 1):
+        """Return the ``k`` nearest students for each probe encoding.
+
+        ``probes`` may be a single encoding or a (Q x 128) array. Returns
+        ``(ids, distances)``, both of shape (Q x k') where k' is ``k``
+        capped at the gallery size, sorted by ascending Euclidean distance.
+        Approximate matchers may pad a row with id -1 / distance inf when
+        fewer than k' candidates were scanned.
+        """
+        queries = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        return self.matcher.search(queries, k)
+
+
+# Shared by every request handled by this process
+gallery = FaceGallery()
+
+registry.register(Gauge("face_gallery_size", "Face encodings in the matching gallery", lambda: len(gallery)))
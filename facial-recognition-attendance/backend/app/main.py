@@ -1,12 +1,37 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import students, attendance, face_recognition
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .routes import students, attendance, face_recognition, sessions
 from .init_db import init_db
+from .executor import face_pool
+from .attendance_queue import attendance_queue
+from .warmup import prime_gallery, readiness, warm_up
+from .metrics import registry
+from . import config
 
-app = FastAPI()
+logging.basicConfig(level=config.LOG_LEVEL)
 
-# Initialize database
-init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize database
+    init_db()
+    await prime_gallery()
+    if config.ATTENDANCE_WRITE_BEHIND:
+        # Writes marks a previous run queued but never committed
+        attendance_queue.start()
+    # Warm up the face workers in the background: the server answers (and
+    # /health/ready reports progress) while the models load
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    if attendance_queue.running:
+        await attendance_queue.stop()
+    face_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -21,7 +46,22 @@ app.add_middleware(
 app.include_router(students.router, prefix="/api", tags=["students"])
 app.include_router(attendance.router, prefix="/api/attendance", tags=["attendance"])
 app.include_router(face_recognition.router, prefix="/api/face-recognition", tags=["face-recognition"])
+app.include_router(sessions.router, prefix="/api", tags=["sessions"])
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Facial Recognition Attendance System API"} 
\ No newline at end of file
+    return {"message": "Welcome to the Facial Recognition Attendance System API"}
+
+@app.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def health_ready():
+    # 503 until warm-up has finished, so load balancers hold traffic back
+    return JSONResponse(readiness.as_dict(), status_code=200 if readiness.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,477 @@
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_result(num_queries: int):
+    return (
+        np.empty((num_queries, 0), dtype=np.int64),
+        np.empty((num_queries, 0), dtype=np.float32),
+    )
+
+
+def _squared_distances(queries: np.ndarray, matrix: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+    # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, as one matrix product
+    sq_dist = (
+        np.einsum("ij,ij->i", queries, queries)[:, None]
+        + sq_norms[None, :]
+        - 2.0 * (queries @ matrix.T)
+    )
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+def _top_k(sq_dist: np.ndarray, k: int):
+    """Indices and squared distances of the k smallest entries per row, sorted."""
+    n = sq_dist.shape[1]
+    if k < n:
+        top = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), sq_dist.shape)
+    top_sq = np.take_along_axis(sq_dist, top, axis=1)
+    order = np.argsort(top_sq, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_sq, order, axis=1)
+
+
+class Matcher:
+    """Interface for nearest-neighbour search over enrolled face encodings.
+
+    Implementations index float32 vectors by ``Student.id`` and must be safe
+    to search while another thread adds or removes students.
+    """
+
+    name = "base"
+    # Changes made by other processes; only matchers shared between server
+    # workers (see shared_gallery) move it
+    version = 0
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray):
+        """Replace the whole index with the given ids and (N x dim) matrix."""
+        raise NotImplementedError
+
+    def add(self, student_id: int, vector: np.ndarray):
+        """Insert or replace one student's encoding."""
+        raise NotImplementedError
+
+    def add_many(self, ids: np.ndarray, matrix: np.ndarray):
+        """Insert or replace several encodings; subclasses batch the update."""
+        for student_id, vector in zip(np.asarray(ids).tolist(), matrix):
+            self.add(student_id, vector)
+
+    def remove(self, student_id: int):
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int = 1):
+        """Return ``(ids, distances)`` of shape (Q x k') for (Q x dim) queries.
+
+        ``k'`` is ``k`` capped at the index size; rows are sorted by
+        ascending Euclidean distance.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        self.build(np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=np.float32))
+
+
+class BruteForceMatcher(Matcher):
+    """Exact search: one contiguous (N x dim) matrix scanned in a single product.
+
+    Writers rebuild the arrays under a lock and swap them in as one snapshot,
+    so searches never take the lock and never see a half-updated index.
+    """
+
+    name = "exact"
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self._lock = threading.Lock()
+        self.clear()
+
+    def _publish(self, ids: np.ndarray, matrix: np.ndarray):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        self._snapshot = (np.asarray(ids, dtype=np.int64), matrix, sq_norms)
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def build(self, ids, matrix):
+        with self._lock:
+            self._publish(ids, matrix)
+
+    def add(self, student_id, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            ids, matrix, _ = self._snapshot
+            existing = np.flatnonzero(ids == student_id)
+            if existing.size:
+                matrix = matrix.copy()
+                matrix[existing[0]] = vector
+            else:
+                ids = np.append(ids, np.int64(student_id))
+                matrix = np.concatenate([matrix, vector])
+            self._publish(ids, matrix)
+
+    def add_many(self, ids, matrix):
+        new_ids = np.asarray(ids, dtype=np.int64)
+        new_matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            ids, matrix, _ = self._snapshot
+            keep = ~np.isin(ids, new_ids)
+            self._publish(np.concatenate([ids[keep], new_ids]), np.concatenate([matrix[keep], new_matrix]))
+
+    def remove(self, student_id):
+        with self._lock:
+            ids, matrix, _ = self._snapshot
+            keep = ids != student_id
+            if keep.all():
+                return
+            self._publish(ids[keep], matrix[keep])
+
+    def search(self, queries, k=1):
+        ids, matrix, sq_norms = self._snapshot
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, len(ids))
+        if k == 0:
+            return _empty_result(len(queries))
+        top, top_sq = _top_k(_squared_distances(queries, matrix, sq_norms), k)
+        return ids[top], np.sqrt(top_sq)
+
+
+def kmeans(matrix: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means returning (n_clusters x dim) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), n_clusters, replace=False)].copy()
+    sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    for _ in range(iterations):
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assignment = np.argmin(
+            centroid_norms[None, :] - 2.0 * (matrix @ centroids.T), axis=1
+        )
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters with the points farthest from their centroid
+        if not filled.all():
+            residual = sq_norms + centroid_norms[assignment] - 2.0 * np.einsum(
+                "ij,ij->i", matrix, centroids[assignment]
+            )
+            far = np.argsort(residual)[::-1][: int((~filled).sum())]
+            centroids[~filled] = matrix[far]
+    return centroids.astype(np.float32)
+
+
+class IVFMatcher(Matcher):
+    """Approximate search with an inverted-file (IVF) index.
+
+    Encodings are bucketed by their nearest k-means centroid. A query is only
+    compared against the ``n_probe`` buckets whose centroids are closest to
+    it, trading recall for latency:
+
+    * ``n_lists``: number of buckets (capped at ~sqrt(N) when training).
+    * ``n_probe``: buckets scanned per query; ``n_probe == n_lists`` is exact.
+    * ``min_train_size``: below this many students a single bucket is used,
+      i.e. the index behaves like brute force.
+
+    Inserts and deletes touch one bucket. The centroids are retrained once the
+    index has grown to ``retrain_growth`` times its size at the last training.
+    """
+
+    name = "ivf"
+
+    def __init__(self, dim: int, n_lists: int = 256, n_probe: int = 8,
+                 min_train_size: int = 2048, retrain_growth: float = 2.0,
+                 kmeans_iterations: int = 10):
+        super().__init__(dim)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._owner)
+
+    def _bucket(self, ids: np.ndarray, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        return (np.asarray(ids, dtype=np.int64), vectors, np.einsum("ij,ij->i", vectors, vectors))
+
+    def _nearest_list(self, centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        return np.argmin(centroid_norms[None, :] - 2.0 * (vectors @ centroids.T), axis=1)
+
+    def build(self, ids, matrix):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self._train(ids, matrix)
+
+    def _train(self, ids: np.ndarray, matrix: np.ndarray):
+        n = len(ids)
+        if n == 0 or n < self.min_train_size:
+            n_lists = 1
+            centroids = (matrix.mean(axis=0, keepdims=True) if n
+                         else np.zeros((1, self.dim), dtype=np.float32))
+            assignment = np.zeros(n, dtype=np.int64)
+        else:
+            n_lists = max(1, min(self.n_lists, int(np.sqrt(n))))
+            centroids = kmeans(matrix, n_lists, self.kmeans_iterations)
+            assignment = self._nearest_list(centroids, matrix)
+
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        lists = tuple(
+            self._bucket(ids[order[bounds[i]:bounds[i + 1]]], matrix[order[bounds[i]:bounds[i + 1]]])
+            for i in range(n_lists)
+        )
+        self._owner = dict(zip(ids.tolist(), assignment.tolist()))
+        self._trained_size = max(n, 1)
+        self._state = (centroids.astype(np.float32), lists)
+        logger.info(f"Trained IVF index with {n_lists} lists over {n} encodings")
+
+    def _all_vectors(self):
+        _, lists = self._state
+        ids = np.concatenate([bucket[0] for bucket in lists])
+        matrix = np.concatenate([bucket[1] for bucket in lists])
+        return ids, matrix
+
+    def _drop_from_list(self, lists: list, student_id: int):
+        list_no = self._owner.pop(student_id, None)
+        if list_no is None:
+            return
+        bucket_ids, vectors, _ = lists[list_no]
+        keep = bucket_ids != student_id
+        lists[list_no] = self._bucket(bucket_ids[keep], vectors[keep])
+
+    def add(self, student_id, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            centroids, lists = self._state
+            lists = list(lists)
+            self._drop_from_list(lists, student_id)
+            list_no = int(self._nearest_list(centroids, vector)[0])
+            bucket_ids, vectors, _ = lists[list_no]
+            lists[list_no] = self._bucket(
+                np.append(bucket_ids, np.int64(student_id)), np.concatenate([vectors, vector])
+            )
+            self._owner[student_id] = list_no
+            self._state = (centroids, tuple(lists))
+
+            size = len(self._owner)
+            if size >= self.min_train_size and size >= self.retrain_growth * self._trained_size:
+                self._train(*self._all_vectors())
+
+    def add_many(self, ids, matrix):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            centroids, lists = self._state
+            lists = list(lists)
+            for student_id in ids.tolist():
+                self._drop_from_list(lists, student_id)
+            assignment = self._nearest_list(centroids, matrix)
+            for list_no in np.unique(assignment).tolist():
+                members = assignment == list_no
+                bucket_ids, vectors, _ = lists[list_no]
+                lists[list_no] = self._bucket(
+                    np.concatenate([bucket_ids, ids[members]]), np.concatenate([vectors, matrix[members]])
+                )
+            self._owner.update(zip(ids.tolist(), assignment.tolist()))
+            self._state = (centroids, tuple(lists))
+
+            size = len(self._owner)
+            if size >= self.min_train_size and size >= self.retrain_growth * self._trained_size:
+                self._train(*self._all_vectors())
+
+    def remove(self, student_id):
+        with self._lock:
+            if student_id not in self._owner:
+                return
+            centroids, lists = self._state
+            lists = list(lists)
+            self._drop_from_list(lists, student_id)
+            self._state = (centroids, tuple(lists))
+
+    def search(self, queries, k=1):
+        centroids, lists = self._state
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        n_probe = min(self.n_probe, len(lists))
+        probe_lists = _top_k(
+            _squared_distances(queries, centroids, np.einsum("ij,ij->i", centroids, centroids)),
+            n_probe,
+        )[0]
+
+        k = min(k, len(self))
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        result_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            buckets = [lists[i] for i in probe_lists[row] if len(lists[i][0])]
+            if not buckets:
+                continue
+            ids = np.concatenate([bucket[0] for bucket in buckets])
+            matrix = np.concatenate([bucket[1] for bucket in buckets])
+            sq_norms = np.concatenate([bucket[2] for bucket in buckets])
+            top, top_sq = _top_k(_squared_distances(query[None, :], matrix, sq_norms), min(k, len(ids)))
+            found = top.shape[1]
+            result_ids[row, :found] = ids[top[0]]
+            result_dist[row, :found] = np.sqrt(top_sq[0])
+        return result_ids, result_dist
+
+
+PRECISIONS = ("float64", "float32", "float16", "int8")
+
+
+class QuantizedMatcher(Matcher):
+    """Exact scan over encodings stored at a selectable precision.
+
+    ``precision`` is ``float64``, ``float32``, ``float16`` or ``int8``; int8
+    codes use a per-dimension centre and scale fitted when the index is
+    built (vectors added later are clipped to that range until the next
+    build). Distances are computed against the decoded vectors
+    ``chunk_size`` rows at a time, so only the compact codes are streamed
+    through the cache.
+
+    With ``rerank`` > 0 the lossy precisions keep float32 copies as well and
+    re-score the best ``rerank`` candidates of the scan exactly: results
+    only differ from the float32 scan when the true nearest student is not
+    on that shortlist. The copies are read for those few rows only.
+    """
+
+    name = "quantized"
+
+    def __init__(self, dim: int, precision: str = "int8", rerank: int = 16, chunk_size: int = 8192):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown gallery precision '{precision}', expected one of {list(PRECISIONS)}")
+        super().__init__(dim)
+        self.precision = precision
+        self.rerank = rerank if precision in ("float16", "int8") else 0
+        self.chunk_size = chunk_size
+        # Distances are accumulated in float64 only for the float64 gallery
+        self._compute_dtype = np.float64 if precision == "float64" else np.float32
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def memory_usage(self) -> dict:
+        """Bytes scanned per search and bytes kept only for re-ranking."""
+        ids, codes, sq_norms, exact, _, _ = self._snapshot
+        return {
+            "scan": ids.nbytes + codes.nbytes + sq_norms.nbytes,
+            "rerank": exact.nbytes if exact is not None else 0,
+        }
+
+    def _fit(self, matrix: np.ndarray):
+        if self.precision != "int8" or len(matrix) == 0:
+            return np.zeros(self.dim, dtype=np.float32), np.ones(self.dim, dtype=np.float32)
+        low, high = matrix.min(axis=0), matrix.max(axis=0)
+        scale = np.maximum((high - low) / 254.0, 1e-6)
+        return ((high + low) / 2.0).astype(np.float32), scale.astype(np.float32)
+
+    def _encode(self, matrix: np.ndarray, center: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        if self.precision == "int8":
+            return np.clip(np.rint((matrix - center) / scale), -127, 127).astype(np.int8)
+        return matrix.astype(self.precision)
+
+    def _decode(self, codes: np.ndarray, center: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        if self.precision == "int8":
+            return codes.astype(np.float32) * scale + center
+        return codes.astype(self._compute_dtype, copy=False)
+
+    def _publish(self, ids, codes, exact, center, scale):
+        sq_norms = np.empty(len(codes), dtype=self._compute_dtype)
+        for start in range(0, len(codes), self.chunk_size):
+            rows = self._decode(codes[start:start + self.chunk_size], center, scale)
+            sq_norms[start:start + len(rows)] = np.einsum("ij,ij->i", rows, rows)
+        self._snapshot = (np.asarray(ids, dtype=np.int64), codes, sq_norms, exact, center, scale)
+
+    def build(self, ids, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            center, scale = self._fit(matrix)
+            exact = matrix.copy() if self.rerank else None
+            self._publish(ids, self._encode(matrix, center, scale), exact, center, scale)
+
+    def add(self, student_id, vector):
+        self.add_many(np.asarray([student_id], dtype=np.int64), vector)
+
+    def add_many(self, ids, matrix):
+        new_ids = np.asarray(ids, dtype=np.int64)
+        new_matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            ids, codes, _, exact, center, scale = self._snapshot
+            keep = ~np.isin(ids, new_ids)
+            self._publish(
+                np.concatenate([ids[keep], new_ids]),
+                np.concatenate([codes[keep], self._encode(new_matrix, center, scale)]),
+                np.concatenate([exact[keep], new_matrix]) if exact is not None else None,
+                center, scale,
+            )
+
+    def remove(self, student_id):
+        with self._lock:
+            ids, codes, _, exact, center, scale = self._snapshot
+            keep = ids != student_id
+            if keep.all():
+                return
+            self._publish(ids[keep], codes[keep], exact[keep] if exact is not None else None, center, scale)
+
+    def search(self, queries, k=1):
+        ids, codes, sq_norms, exact, center, scale = self._snapshot
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, len(ids))
+        if k == 0:
+            return _empty_result(len(queries))
+
+        probes = queries.astype(self._compute_dtype, copy=False)
+        sq_dist = np.empty((len(queries), len(ids)), dtype=self._compute_dtype)
+        if self.precision == "int8":
+            # q.(center + scale * code) = q.center + (q * scale).code: the
+            # codes are only widened, never rescaled
+            scaled = probes * scale
+            offset = np.einsum("ij,ij->i", probes, probes)[:, None] - 2.0 * (probes @ center)[:, None]
+        for start in range(0, len(ids), self.chunk_size):
+            end = min(start + self.chunk_size, len(ids))
+            if self.precision == "int8":
+                block = offset + sq_norms[None, start:end] - 2.0 * (scaled @ codes[start:end].astype(np.float32).T)
+                sq_dist[:, start:end] = np.maximum(block, 0.0)
+            else:
+                rows = self._decode(codes[start:end], center, scale)
+                sq_dist[:, start:end] = _squared_distances(probes, rows, sq_norms[start:end])
+        top, top_sq = _top_k(sq_dist, min(len(ids), max(k, self.rerank)) if exact is not None else k)
+
+        if exact is not None:
+            # Exact float32 distances for the shortlist only
+            difference = exact[top] - queries[:, None, :]
+            exact_sq = np.einsum("qsd,qsd->qs", difference, difference)
+            order = np.argsort(exact_sq, axis=1)[:, :k]
+            top, top_sq = np.take_along_axis(top, order, axis=1), np.take_along_axis(exact_sq, order, axis=1)
+        return ids[top], np.sqrt(top_sq).astype(np.float32)
+
+
+MATCHERS = {
+    BruteForceMatcher.name: BruteForceMatcher,
+    IVFMatcher.name: IVFMatcher,
+    QuantizedMatcher.name: QuantizedMatcher,
+}
+
+
+def create_matcher(kind: str, dim: int, **options) -> Matcher:
+    try:
+        matcher_class = MATCHERS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown face matcher '{kind}', expected one of {sorted(MATCHERS)}")
+    return matcher_class(dim, **options)
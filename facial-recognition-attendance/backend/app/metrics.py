@@ -0,0 +1,173 @@
+"""In-process metrics served at /metrics in the Prometheus text format.
+
+A minimal counter/gauge/histogram registry rather than prometheus_client:
+every face job reports its stage timings back to the API process, so one
+process-local registry sees the whole pipeline and there is no
+multiprocess collector to set up.
+"""
+import logging
+import random
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+from . import config
+
+# Seconds; spans a cached frame hash (~1 ms) up to a CNN detection (seconds)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+trace_logger = logging.getLogger("app.trace")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally per label values.
+
+    With ``function`` the value is read at scrape time instead (for counts
+    kept elsewhere, e.g. the recognition cache).
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), function: Callable = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+        self._function = function
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def _samples(self):
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.label_names:
+            values = [((), 0.0)]
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Current value, read from ``function`` at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable):
+        super().__init__(name, documentation)
+        self._function = function
+
+    def _samples(self):
+        yield f"{self.name} {_format_value(self._function())}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum]
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((label_values, list(counts)) for label_values, counts in self._series.items())
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "face_stage_seconds",
+    "Time spent per recognition pipeline stage (read, base64, decode_header, decode, decode_resize, "
+    "decode_orient, decode_rgb, resize, detect_<stage>, encode, "
+    "queue, cache, match, db_fetch, insert)",
+    labels=("stage",),
+))
+DETECTIONS = registry.register(Counter(
+    "face_detections_total", "Faces located, by the detection stage (or fallback) that found them",
+    labels=("detector",),
+))
+OUTCOMES = registry.register(Counter(
+    "face_recognition_outcomes_total", "Recognition results by route and outcome",
+    labels=("route", "outcome"),
+))
+
+
+def observe_stages(timings: Dict[str, float]):
+    """Record a request's stage timings (milliseconds, as in Server-Timing)."""
+    for stage, duration in timings.items():
+        STAGE_SECONDS.observe(duration / 1000.0, stage)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Stage timings as a Server-Timing header value."""
+    return ", ".join(f"{stage};dur={duration:.1f}" for stage, duration in timings.items())
+
+
+def trace_sampled(forced: bool = False) -> bool:
+    """Whether this request's per-student details should be logged.
+
+    A fraction ``config.TRACE_SAMPLE_RATE`` of requests is traced, plus any
+    request asking for it (``X-Trace: 1``).
+    """
+    return forced or (config.TRACE_SAMPLE_RATE > 0 and random.random() < config.TRACE_SAMPLE_RATE)
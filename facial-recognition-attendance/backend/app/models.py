@@ -1,15 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, LargeBinary, Index, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import date, datetime, timedelta, timezone
 from app.database import Base
 
+# Define IST timezone offset (UTC+5:30)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def attendance_day(timestamp: datetime) -> date:
+    """The IST calendar day an attendance timestamp counts towards."""
+    if timestamp is None:
+        return datetime.now(IST).date()
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(IST).date()
+    return timestamp.date()
+
+def _default_attendance_date(context):
+    return attendance_day(context.get_current_parameters().get("timestamp"))
+
 class Student(Base):
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(String, unique=True, index=True)
     full_name = Column(String)
-    face_encoding = Column(String)  # Store as JSON string
+    face_encoding = Column(LargeBinary)  # float32 blob, see face_codec
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -22,6 +37,71 @@ class AttendanceRecord(Base):
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    attendance_date = Column(Date, nullable=False, default=_default_attendance_date)  # IST day of timestamp
     status = Column(String)  # present, absent, late
 
-    student = relationship("Student", back_populates="attendance_records") 
\ No newline at end of file
+    student = relationship("Student", back_populates="attendance_records")
+
+    # One record per student per IST day; also serves the per-day lookups.
+    # (timestamp, id) is the keyset order of crud.get_attendance_page, and
+    # (student_id, attendance_date, status) covers the attendance_stats scans
+    __table_args__ = (
+        Index("ux_attendance_records_student_date", "student_id", "attendance_date", unique=True),
+        Index("ix_attendance_records_timestamp_id", "timestamp", "id"),
+        Index("ix_attendance_records_student_date_status", "student_id", "attendance_date", "status"),
+    )
+
+class DailyAttendanceSummary(Base):
+    __tablename__ = "daily_attendance_summary"
+
+    # Maintained incrementally by attendance_summary; rebuild with
+    # python -m migrations.daily_attendance_summary
+    date = Column(Date, primary_key=True)  # IST calendar day
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# Roster: which students are enrolled in which section
+section_students = Table(
+    "section_students",
+    Base.metadata,
+    Column("section_id", Integer, ForeignKey("sections.id"), primary_key=True),
+    Column("student_id", Integer, ForeignKey("students.id"), primary_key=True, index=True),
+)
+
+class Course(Base):
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True)
+    name = Column(String)
+
+    sections = relationship("Section", back_populates="course")
+
+class Section(Base):
+    __tablename__ = "sections"
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=False, index=True)
+    name = Column(String)
+
+    course = relationship("Course", back_populates="sections")
+    students = relationship("Student", secondary=section_students)
+    class_sessions = relationship("ClassSession", back_populates="section")
+
+class ClassSession(Base):
+    __tablename__ = "class_sessions"
+
+    # One scheduled meeting of a section, optionally pinned to the kiosk in
+    # its room; recognition at that kiosk searches the section roster first
+    id = Column(Integer, primary_key=True, index=True)
+    section_id = Column(Integer, ForeignKey("sections.id"), nullable=False)
+    kiosk_id = Column(String, nullable=True)
+    starts_at = Column(DateTime(timezone=True), nullable=False)
+    ends_at = Column(DateTime(timezone=True), nullable=False)
+
+    section = relationship("Section", back_populates="class_sessions")
+
+    # Serves the "active session at this kiosk" lookup of every scan
+    __table_args__ = (
+        Index("ix_class_sessions_kiosk_starts", "kiosk_id", "starts_at"),
+    )
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+import numpy as np
+from . import config
+from .metrics import Counter, Gauge, registry
+
+# dHash over a (HASH_SIZE + 1) x HASH_SIZE grayscale thumbnail: 256 bits
+HASH_SIZE = 16
+
+# Returned by FrameResultCache.get when nothing matches (None is a valid
+# cached result: "no matching student")
+MISS = object()
+
+
+def frame_hash(image_data: bytes) -> Optional[int]:
+    """Perceptual difference hash of an encoded frame, or None if undecodable.
+
+    JPEGs are decoded at 1/8 scale straight from the DCT coefficients, so
+    this costs a small fraction of a face detection. Frames that look the
+    same (the same person standing still in front of the kiosk) get hashes
+    a few bits apart even when the JPEG bytes differ.
+    """
+    import cv2  # deferred like in face_pipeline; only recognition needs it
+    buffer = np.frombuffer(memoryview(image_data), dtype=np.uint8)
+    thumbnail = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if thumbnail is None:
+        return None
+    thumbnail = cv2.resize(thumbnail, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class FrameResultCache:
+    """Bounded LRU/TTL cache of recognition results keyed by kiosk and frame hash.
+
+    A lookup hits when a live entry from the same kiosk has a hash within
+    ``max_distance`` bits (Hamming distance) of the probe, so entries are
+    scanned linearly; keep ``max_entries`` in the hundreds. Kiosks never
+    share entries: a similar-looking frame elsewhere is a different person.
+    Entries also record the gallery generation they were computed against
+    and are ignored once it changes.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_distance: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # (kiosk, hash) -> (expires_at, generation, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kiosk_id: Hashable, key: Optional[int], generation: int):
+        """The cached result for a near-identical frame from ``kiosk_id``, or ``MISS``."""
+        if key is None or self.max_entries <= 0:
+            return MISS
+        now = time.monotonic()
+        with self._lock:
+            found = MISS
+            for cached_key, (expires_at, cached_generation, result) in list(self._entries.items()):
+                cached_kiosk, cached_hash = cached_key
+                if expires_at <= now or cached_generation != generation:
+                    del self._entries[cached_key]
+                elif (found is MISS and cached_kiosk == kiosk_id
+                      and (cached_hash ^ key).bit_count() <= self.max_distance):
+                    self._entries.move_to_end(cached_key)
+                    found = result
+            if found is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return found
+
+    def put(self, kiosk_id: Hashable, key: Optional[int], generation: int, result):
+        if key is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(kiosk_id, key)] = (time.monotonic() + self.ttl_seconds, generation, result)
+            self._entries.move_to_end((kiosk_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class RecentStudents:
+    """Short-lived memory of students already marked, per kiosk.
+
+    Lets a kiosk answer "already marked" for the person still standing in
+    front of it without another database round trip.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (kiosk, student, day) -> expires_at
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def seen(self, key: Hashable) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                expires_at = None
+            if expires_at is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+
+    def add(self, key: Hashable):
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+frame_cache = FrameResultCache(
+    config.RECOGNITION_CACHE_SIZE, config.RECOGNITION_CACHE_TTL_S, config.RECOGNITION_CACHE_MAX_DISTANCE
+)
+recent_students = RecentStudents(config.RECENT_STUDENT_TTL_S)
+
+registry.register(Counter("recognition_frame_cache_hits_total", "Frames answered from the frame cache",
+                          function=lambda: frame_cache.hits))
+registry.register(Counter("recognition_frame_cache_misses_total", "Frames that needed detection",
+                          function=lambda: frame_cache.misses))
+registry.register(Gauge("recognition_frame_cache_entries", "Frames in the frame cache",
+                        lambda: frame_cache.stats()["size"]))
+registry.register(Counter("recognition_recent_student_hits_total",
+                          "Repeat recognitions answered without the database", function=lambda: recent_students.hits))
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .models import ClassSession, Student, section_students
+from .face_codec import unpack_encoding
+from .gallery import gallery, ENCODING_DIM
+from .matching import BruteForceMatcher
+from .metrics import Counter, registry
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Define IST timezone offset (UTC+5:30)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+MATCH_SCOPES = registry.register(Counter(
+    "face_match_scope_total",
+    "Probes matched within a session roster (roster), matched globally after the roster had no "
+    "match (fallback), or matched globally with no session (global)",
+    labels=("scope",),
+))
+
+
+class SessionNotFoundError(LookupError):
+    pass
+
+
+def resolve_section(db: Session, session_id: Optional[int] = None, kiosk_id: Optional[str] = None) -> Optional[int]:
+    """Section whose roster a probe should be matched against first.
+
+    An explicit ``session_id`` wins; otherwise the session scheduled at
+    ``kiosk_id`` right now, if any. None means search the whole gallery.
+    """
+    if session_id is not None:
+        section_id = db.scalar(select(ClassSession.section_id).where(ClassSession.id == session_id))
+        if section_id is None:
+            raise SessionNotFoundError(f"Session {session_id} not found")
+        return section_id
+    if not kiosk_id:
+        return None
+    now = datetime.now(IST)
+    return db.scalar(
+        select(ClassSession.section_id)
+        .where(ClassSession.kiosk_id == kiosk_id, ClassSession.starts_at <= now, ClassSession.ends_at > now)
+        .order_by(ClassSession.starts_at.desc())
+        .limit(1)
+    )
+
+
+class RosterIndex:
+    """Per-section encoding sub-matrices, searched before the global gallery.
+
+    A section's matrix is built from its roster the first time it is needed
+    and reused until the gallery or any roster changes (``gallery.generation``
+    and ``self.generation``), so a lecture-hall kiosk compares each probe
+    against its ~60 expected students instead of every enrolled one.
+
+    With a ``shared_generation`` counter (FACE_MATCHER=shared) roster
+    changes made by any server process invalidate every process's matrices.
+    """
+
+    def __init__(self, dim: int = ENCODING_DIM, shared_generation=None):
+        self.dim = dim
+        self._changes = 0
+        self._shared_generation = shared_generation
+        self._matchers = {}  # section_id -> (gallery generation, roster generation, matcher)
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Moves on whenever a roster changes; also part of the frame cache key."""
+        if self._shared_generation is not None:
+            return self._shared_generation.value
+        return self._changes
+
+    def invalidate(self):
+        with self._lock:
+            if self._shared_generation is not None:
+                self._shared_generation.increment()
+            else:
+                self._changes += 1
+            self._matchers.clear()
+
+    def matcher(self, db: Session, section_id: int) -> BruteForceMatcher:
+        key = (gallery.generation, self.generation)
+        cached = self._matchers.get(section_id)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+
+        rows = db.execute(
+            select(Student.id, Student.face_encoding)
+            .join(section_students, section_students.c.student_id == Student.id)
+            .where(section_students.c.section_id == section_id, Student.face_encoding.isnot(None))
+        ).all()
+        ids = []
+        vectors = []
+        for student_id, face_encoding in rows:
+            try:
+                vector = unpack_encoding(face_encoding)
+            except (TypeError, ValueError):
+                continue
+            if vector.shape == (self.dim,):
+                ids.append(student_id)
+                vectors.append(vector)
+        matcher = BruteForceMatcher(self.dim)
+        if vectors:
+            matcher.build(np.asarray(ids, dtype=np.int64), np.stack(vectors))
+        with self._lock:
+            if key == (gallery.generation, self.generation):
+                self._matchers[section_id] = (*key, matcher)
+        logger.debug(f"Built roster index for section {section_id}: {len(ids)} encodings")
+        return matcher
+
+    def search(self, db: Session, section_id: Optional[int], probes, threshold: float, k: int = 1):
+        """Roster-first nearest-student search.
+
+        Like ``gallery.search`` (Q x k' ids and distances) plus a scope per
+        probe: ``roster`` when the section roster has a student within
+        ``threshold``, otherwise the global gallery's answer (``fallback``,
+        or ``global`` when there is no section).
+        """
+        queries = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        global_k = min(k, len(gallery))
+        if section_id is None:
+            MATCH_SCOPES.inc("global", amount=len(queries))
+            ids, distances = gallery.search(queries, global_k)
+            return ids, distances, ["global"] * len(queries)
+
+        roster = self.matcher(db, section_id)
+        width = max(global_k, min(k, len(roster)))
+        ids = np.full((len(queries), width), -1, dtype=np.int64)
+        distances = np.full((len(queries), width), np.inf, dtype=np.float32)
+        if len(roster):
+            roster_ids, roster_distances = roster.search(queries, k)
+            ids[:, :roster_ids.shape[1]] = roster_ids
+            distances[:, :roster_ids.shape[1]] = roster_distances
+        in_roster = distances[:, 0] < threshold if width else np.zeros(len(queries), dtype=bool)
+        scopes = ["roster" if matched else "fallback" for matched in in_roster.tolist()]
+
+        fallback = np.flatnonzero(~in_roster)
+        if len(fallback) and global_k:
+            global_ids, global_distances = gallery.search(queries[fallback], global_k)
+            ids[fallback] = -1
+            distances[fallback] = np.inf
+            ids[fallback, :global_ids.shape[1]] = global_ids
+            distances[fallback, :global_ids.shape[1]] = global_distances
+        if len(fallback) < len(queries):
+            MATCH_SCOPES.inc("roster", amount=len(queries) - len(fallback))
+        if len(fallback):
+            MATCH_SCOPES.inc("fallback", amount=len(fallback))
+        return ids, distances, scopes
+
+
+def default_roster_index() -> RosterIndex:
+    if config.FACE_MATCHER == "shared":
+        # Published next to the shared gallery for the other server workers
+        from .shared_gallery import SharedCounter
+        return RosterIndex(shared_generation=SharedCounter(os.path.join(config.GALLERY_SHARED_DIR, "roster_version")))
+    return RosterIndex()
+
+
+# Shared by every request handled by this process
+roster_index = default_roster_index()
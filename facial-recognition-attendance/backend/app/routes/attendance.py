@@ -1,48 +1,73 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from sqlalchemy.types import Date
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime, date, timedelta, timezone
 import numpy as np
-import json
 import logging
+import time
 from ..database import get_db
-from ..models import Student, AttendanceRecord
+from ..models import Student, AttendanceRecord, DailyAttendanceSummary
+from ..gallery import gallery
+from ..rosters import SessionNotFoundError, resolve_section, roster_index
+from ..metrics import OUTCOMES, observe_stages, server_timing, trace_logger, trace_sampled
 from ..schemas import AttendanceRecordCreate, AttendanceRecord as AttendanceRecordSchema, FaceRecognitionRequest
 from .. import crud, schemas
-from ..crud import create_attendance_record, get_user_attendance
+from ..attendance_stats import month_grid, student_stats
+from .. import attendance_export
+from ..crud import get_user_attendance
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Define IST timezone offset (UTC+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Maximum encoding distance accepted by mark_attendance_by_face
+FACE_MATCH_THRESHOLD = 0.6
+
 router = APIRouter()
 
 @router.post("/", response_model=schemas.AttendanceRecord)
 def create_attendance(attendance: schemas.AttendanceRecordCreate, db: Session = Depends(get_db)):
-    return create_attendance_record(db, attendance)
+    return crud.create_attendance_record(db, attendance)
+
+@router.post("/bulk", response_model=Dict)
+def create_attendance_bulk(request: schemas.BulkAttendanceRequest, db: Session = Depends(get_db)):
+    # Roll call / imports: one transaction for the whole list, one outcome per item
+    try:
+        outcomes = crud.mark_attendance_bulk(db, request.records)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database error in bulk attendance: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    marked_count = sum(1 for outcome in outcomes if outcome["outcome"] == "marked")
+    logger.info(f"Bulk attendance: {marked_count} of {len(outcomes)} records marked")
+    return {"marked_count": marked_count, "outcomes": outcomes}
 
 @router.get("/analytics", response_model=Dict)
-def get_analytics(db: Session = Depends(get_db)):
-    # Get current time in IST
-    current_time = datetime.now(IST)
-    today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
+def get_analytics(days: int = Query(7, ge=1, le=366), db: Session = Depends(get_db)):
+    # Get current date in IST
+    today = datetime.now(IST).date()
+    history_start = today - timedelta(days=days)
     
     # Get total registered students
     total_students = db.query(Student).count()
     
-    # Get today's attendance records
-    today_attendance = db.query(AttendanceRecord).filter(
-        AttendanceRecord.timestamp >= today_start,
-        AttendanceRecord.timestamp < today_end
-    ).all()
+    # One query over the daily rollup covers today and the whole history window
+    daily_counts = dict(
+        db.query(DailyAttendanceSummary.date, func.sum(DailyAttendanceSummary.count))
+        .filter(
+            DailyAttendanceSummary.date >= history_start,
+            DailyAttendanceSummary.date <= today
+        )
+        .group_by(DailyAttendanceSummary.date)
+        .all()
+    )
     
     # Count present students
-    present_today = len(today_attendance)
+    present_today = daily_counts.get(today, 0)
     
     # Calculate absent students
     absent_today = total_students - present_today
@@ -50,21 +75,13 @@ def get_analytics(db: Session = Depends(get_db)):
     # Get attendance percentage
     attendance_percentage = (present_today / total_students * 100) if total_students > 0 else 0
     
-    # Get attendance history for the last 7 days
-    history_start = today_start - timedelta(days=7)
+    # Get attendance history for the requested number of days before today
     attendance_history = []
-    
-    for i in range(7):
-        day_start = history_start + timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-        
-        day_attendance = db.query(AttendanceRecord).filter(
-            AttendanceRecord.timestamp >= day_start,
-            AttendanceRecord.timestamp < day_end
-        ).count()
-        
+    for i in range(days):
+        day = history_start + timedelta(days=i)
+        day_attendance = daily_counts.get(day, 0)
         attendance_history.append({
-            "date": day_start.strftime("%Y-%m-%d"),
+            "date": day.strftime("%Y-%m-%d"),
             "present": day_attendance,
             "absent": total_students - day_attendance
         })
@@ -113,6 +130,82 @@ def get_today_attendance(db: Session = Depends(get_db)):
         # Return empty list instead of raising an exception to prevent frontend errors
         return []
 
+@router.get("/records", response_model=schemas.AttendancePage)
+def get_attendance_range(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    # Pass next_cursor back as ?cursor= (with the same filters) for the next page
+    try:
+        after = crud.decode_attendance_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    records, next_key = crud.get_attendance_page(
+        db,
+        from_date=from_date,
+        to_date=to_date,
+        student_id=student_id,
+        status=status,
+        after=after,
+        limit=limit
+    )
+    return {
+        "records": records,
+        "next_cursor": crud.encode_attendance_cursor(next_key) if next_key else None
+    }
+
+@router.get("/calendar", response_model=Dict)
+def get_month_grid(
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="YYYY-MM, defaults to the current IST month"),
+    db: Session = Depends(get_db)
+):
+    # counts[status][i] is the number of records with that status on day i + 1
+    if month is None:
+        today = datetime.now(IST).date()
+        year, month_number = today.year, today.month
+    else:
+        year, month_number = (int(part) for part in month.split("-"))
+    return month_grid(db, year, month_number)
+
+@router.get("/student-stats", response_model=Dict)
+def get_student_stats(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    # Defaults to the last 30 days (IST), today included
+    to_date = to_date or datetime.now(IST).date()
+    from_date = from_date or to_date - timedelta(days=29)
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    return student_stats(db, from_date, to_date)
+
+@router.get("/export")
+def export_attendance(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    format: str = Query("csv", pattern="^(csv|parquet|arrow)$")
+):
+    # Streams attendance joined with students in batches, so memory stays
+    # flat however many rows the range holds
+    media_type, extension, needs_pyarrow = attendance_export.EXPORT_FORMATS[format]
+    if needs_pyarrow and not attendance_export.pyarrow_available():
+        raise HTTPException(status_code=400, detail=f"{format} export requires pyarrow to be installed")
+
+    statement = attendance_export.export_statement(from_date, to_date)
+    filename = f"attendance_{from_date or 'start'}_{to_date or 'end'}.{extension}"
+    return StreamingResponse(
+        attendance_export.iter_export(statement, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/{user_id}", response_model=List[schemas.AttendanceRecord])
 def get_user_attendance_records(user_id: int, db: Session = Depends(get_db)):
     return get_user_attendance(db, user_id)
@@ -144,93 +237,68 @@ def create_attendance_record(
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Create new attendance record
-    db_attendance = AttendanceRecord(
-        student_id=student_id,
-        timestamp=datetime.now(),
-        status=attendance.status
-    )
-    db.add(db_attendance)
-    db.commit()
-    db.refresh(db_attendance)
+    # Create new attendance record, unless already marked for today
+    db_attendance = crud.insert_attendance_once(db, student_id, attendance.status)
+    if db_attendance is None:
+        raise HTTPException(status_code=400, detail="Attendance already marked for today")
     return db_attendance
 
 @router.post("/face-recognition/", response_model=AttendanceRecordSchema)
 async def mark_attendance_by_face(
     request: FaceRecognitionRequest,
+    response: Response,
     db: Session = Depends(get_db)
 ):
+    timings = {}
     try:
-        logger.debug(f"Received face recognition request with encoding length: {len(request.face_encoding)}")
-        
-        # Get all students with face encodings
-        students = db.query(Student).filter(Student.face_encoding.isnot(None)).all()
-        logger.debug(f"Found {len(students)} students with face encodings")
-        
-        if not students:
+        if len(gallery) == 0:
             logger.error("No students with face encodings found in database")
             raise HTTPException(status_code=404, detail="No students with face encodings found")
         
         # Convert the input face encoding to numpy array
         input_encoding = np.array(request.face_encoding)
-        logger.debug(f"Input encoding shape: {input_encoding.shape}")
         
-        # Initialize variables for best match
-        best_match = None
-        best_distance = float('inf')
+        try:
+            section_id = resolve_section(db, request.session_id, request.kiosk_id)
+        except SessionNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         
-        # Compare with all stored face encodings
-        for student in students:
-            if student.face_encoding:
-                try:
-                    stored_encoding = np.array(json.loads(student.face_encoding))
-                    logger.debug(f"Student {student.id} encoding shape: {stored_encoding.shape}")
-                    
-                    # Calculate Euclidean distance between encodings
-                    distance = np.linalg.norm(input_encoding - stored_encoding)
-                    logger.debug(f"Distance for student {student.id}: {distance}")
-                    
-                    # Update best match if this is closer
-                    if distance < best_distance:
-                        best_distance = distance
-                        best_match = student
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding face encoding for student {student.id}: {str(e)}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Unexpected error processing student {student.id}: {str(e)}")
-                    continue
+        # Compare with the session roster first, then (if nothing is close
+        # enough) all stored face encodings, in batched distance computations
+        started = time.perf_counter()
+        match_ids, match_distances, _ = roster_index.search(db, section_id, input_encoding, FACE_MATCH_THRESHOLD)
+        best_distance = float(match_distances[0, 0])
+        timings["match"] = (time.perf_counter() - started) * 1000.0
+        started = time.perf_counter()
+        best_match = db.query(Student).filter(Student.id == int(match_ids[0, 0])).first()
+        timings["db_fetch"] = (time.perf_counter() - started) * 1000.0
         
-        logger.debug(f"Best match: {best_match.id if best_match else None}, Distance: {best_distance}")
+        if trace_sampled():
+            trace_logger.info(f"Best match: {best_match.id if best_match else None}, Distance: {best_distance}")
         
         # Check if we found a match within reasonable distance
-        if best_match and best_distance < 0.6:  # Threshold for face matching
-            # Check if attendance already marked for today
-            today = datetime.now().date()
-            existing_attendance = db.query(AttendanceRecord).filter(
-                AttendanceRecord.student_id == best_match.id,
-                AttendanceRecord.timestamp.cast(Date) == today
-            ).first()
-            
-            if existing_attendance:
+        if best_match and best_distance < FACE_MATCH_THRESHOLD:
+            # Create new attendance record; the per-day unique index rejects duplicates
+            started = time.perf_counter()
+            db_attendance = crud.insert_attendance_once(db, best_match.id, "present")
+            timings["insert"] = (time.perf_counter() - started) * 1000.0
+            if db_attendance is None:
+                OUTCOMES.inc("encoding", "already_marked")
                 logger.warning(f"Attendance already marked for student {best_match.id} today")
                 raise HTTPException(status_code=400, detail="Attendance already marked for today")
             
-            # Create new attendance record
-            db_attendance = AttendanceRecord(
-                student_id=best_match.id,
-                timestamp=datetime.now(),
-                status="present"
-            )
-            db.add(db_attendance)
-            db.commit()
-            db.refresh(db_attendance)
-            
+            OUTCOMES.inc("encoding", "marked")
             logger.info(f"Successfully marked attendance for student {best_match.id}")
+            response.headers["Server-Timing"] = server_timing(timings)
             return db_attendance
         else:
+            OUTCOMES.inc("encoding", "no_match")
             logger.warning(f"No matching face found. Best distance: {best_distance}")
             raise HTTPException(status_code=404, detail="No matching face found")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in face recognition: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        observe_stages(timings) 
\ No newline at end of file
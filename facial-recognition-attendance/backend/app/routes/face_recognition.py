@@ -1,25 +1,40 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
+import asyncio
 import numpy as np
-import face_recognition
 import base64
-import json
 import logging
-import cv2
-from io import BytesIO
-from PIL import Image
+import time
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
-from ..database import get_db
-from ..models import Student, AttendanceRecord
+from ..database import SessionLocal, get_db
+from ..models import Student
+from .. import config, crud
+from ..gallery import gallery
+from ..executor import face_pool, PoolSaturatedError
+from ..metrics import DETECTIONS, OUTCOMES, observe_stages, server_timing, trace_logger, trace_sampled
+from ..recognition_cache import MISS, frame_cache, frame_hash, recent_students
+from ..attendance_queue import attendance_queue
+from ..rosters import SessionNotFoundError, resolve_section, roster_index
+from ..face_tracking import IoUTracker
+from ..face_pipeline import (
+    ImageDecodeError, encode_single_face, encode_probe_face, encode_all_faces,
+    detect_stream_faces, encode_faces_at
+)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Define IST timezone offset (UTC+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Maximum encoding distance accepted as a match (more lenient than dlib's usual 0.6).
+# Candidates come from the gallery's matcher, exact or approximate (config.FACE_MATCHER).
+MATCH_THRESHOLD = 0.7
+# Nearest students logged for a traced request
+TRACE_CANDIDATES = 5
+
 router = APIRouter()
 
 class ImageRequest(BaseModel):
@@ -28,211 +43,563 @@ class ImageRequest(BaseModel):
 class FaceEncodingResponse(BaseModel):
     face_encoding: list[float]
 
-@router.post("/encode", response_model=FaceEncodingResponse)
-async def encode_face(image_request: ImageRequest):
+class BatchImageRequest(BaseModel):
+    image: Optional[str] = None  # one base64 encoded group photo
+    images: Optional[List[str]] = None  # or several base64 encoded images
+    # Match against this session's roster first (or the session active at the kiosk)
+    session_id: Optional[int] = None
+    kiosk_id: Optional[str] = None
+
+# Besides the JSON {"image": "<base64 data URL>"} body, the encode and
+# recognize endpoints accept the raw JPEG/PNG bytes, either as the whole
+# request body or as the "image" field of a multipart form. That skips the
+# base64 inflation on the wire and the extra string/bytes copies.
+RAW_IMAGE_CONTENT_TYPES = {"application/octet-stream", "image/jpeg", "image/png"}
+
+_binary_schema = {"type": "string", "format": "binary"}
+IMAGE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": ImageRequest.model_json_schema()},
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"image": _binary_schema},
+                    "required": ["image"],
+                }
+            },
+            **{content_type: {"schema": _binary_schema} for content_type in sorted(RAW_IMAGE_CONTENT_TYPES)},
+        },
+    }
+}
+
+def _decode_base64_image(image_str: str) -> bytes:
+    if ',' in image_str:
+        image_str = image_str.split(',')[1]
+    return base64.b64decode(image_str)
+
+async def _read_image_upload(request: Request, timings: dict) -> bytes:
+    """Return the encoded image bytes from a JSON, multipart or raw request body."""
+    started = time.perf_counter()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("image")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart body must contain an 'image' file field")
+        image_data = await upload.read()
+        timings["read"] = (time.perf_counter() - started) * 1000.0
+    elif content_type in RAW_IMAGE_CONTENT_TYPES:
+        image_data = await request.body()
+        timings["read"] = (time.perf_counter() - started) * 1000.0
+    else:
+        try:
+            image_request = ImageRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+            )
+        timings["read"] = (time.perf_counter() - started) * 1000.0
+        started = time.perf_counter()
+        try:
+            image_data = _decode_base64_image(image_request.image)
+        except Exception as e:
+            logger.error(f"Error decoding base64 image: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+        timings["base64"] = (time.perf_counter() - started) * 1000.0
+    
+    if not image_data:
+        raise HTTPException(status_code=400, detail="Empty image")
+    logger.debug(f"Received {content_type or 'unknown'} image upload, size: {len(image_data)} bytes")
+    return image_data
+
+async def _run_in_pool(fn, image_data: bytes, timings: dict):
+    """Run a face_pipeline function in the worker pool, collecting stage timings."""
     try:
-        # Decode base64 image
-        image_data = base64.b64decode(image_request.image.split(',')[1])
-        image = Image.open(BytesIO(image_data))
-        
-        # Convert PIL Image to numpy array
-        image_array = np.array(image)
-        
-        # Find face locations with more lenient parameters
-        face_locations = face_recognition.face_locations(image_array, model="hog", number_of_times_to_upsample=2)
+        result, queue_ms = await face_pool.run(fn, image_data)
+    except PoolSaturatedError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timings["queue"] = timings.get("queue", 0.0) + queue_ms
+    for stage, duration in result["timings"].items():
+        timings[stage] = timings.get(stage, 0.0) + duration
+    return result
+
+def _resolve_section(db: Session, session_id: Optional[int], kiosk_id: Optional[str], timings: dict) -> Optional[int]:
+    """Section roster to search first for this request, None for the whole gallery."""
+    started = time.perf_counter()
+    try:
+        return resolve_section(db, session_id, kiosk_id)
+    except SessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        timings["session"] = (time.perf_counter() - started) * 1000.0
+
+def _set_server_timing(response: Response, timings: dict):
+    response.headers["Server-Timing"] = server_timing(timings)
+
+@router.post("/encode", response_model=FaceEncodingResponse, openapi_extra=IMAGE_UPLOAD_OPENAPI)
+async def encode_face(request: Request, response: Response):
+    timings = {}
+    image_data = await _read_image_upload(request, timings)
+    try:
+        # Detect and encode in a worker process
+        result = await _run_in_pool(encode_single_face, image_data, timings)
         
-        if not face_locations:
+        if result["face_count"] == 0:
             raise HTTPException(status_code=400, detail="No face detected in the image")
         
-        if len(face_locations) > 1:
+        if result["face_count"] > 1:
             raise HTTPException(status_code=400, detail="Multiple faces detected in the image")
         
-        # Get face encoding
-        face_encodings = face_recognition.face_encodings(image_array, face_locations)
-        
-        if not face_encodings:
+        if result["encoding"] is None:
             raise HTTPException(status_code=400, detail="Could not encode face")
         
+        _set_server_timing(response, timings)
         # Convert numpy array to list for JSON serialization
-        encoding_list = face_encodings[0].tolist()
-        
-        return {"face_encoding": encoding_list}
+        return {"face_encoding": result["encoding"].tolist()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in encode_face: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        observe_stages(timings)
 
-@router.post("/")
-async def recognize_face(image_request: ImageRequest, db: Session = Depends(get_db)):
-    try:
-        logger.info("Starting face recognition process")
-        
-        # Decode base64 image
-        try:
-            image_str = image_request.image
-            if ',' in image_str:
-                image_data = base64.b64decode(image_str.split(',')[1])
-            else:
-                image_data = base64.b64decode(image_str)
-                
-            logger.debug(f"Successfully decoded base64 image, size: {len(image_data)} bytes")
-        except Exception as e:
-            logger.error(f"Error decoding base64 image: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
-        
-        # Open image
-        try:
-            image = Image.open(BytesIO(image_data))
-            logger.debug(f"Successfully opened image, format: {image.format}, size: {image.size}")
-        except Exception as e:
-            logger.error(f"Error opening image: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Could not open image: {str(e)}")
-        
-        # Convert PIL Image to numpy array
-        try:
-            image_array = np.array(image)
-            logger.debug(f"Converted image to array, shape: {image_array.shape}")
-            
-            # Pre-process the image to improve face detection
-            # Resize the image if it's too small
-            if image_array.shape[0] < 300 or image_array.shape[1] < 300:
-                scale_factor = max(300 / image_array.shape[0], 300 / image_array.shape[1])
-                new_size = (int(image_array.shape[1] * scale_factor), int(image_array.shape[0] * scale_factor))
-                image_array = cv2.resize(image_array, new_size)
-                logger.debug(f"Resized image to shape: {image_array.shape}")
-        except Exception as e:
-            logger.error(f"Error converting image to array: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
-        
-        # Find face locations with more lenient parameters
+@router.post("/", openapi_extra=IMAGE_UPLOAD_OPENAPI)
+async def recognize_face(
+    request: Request,
+    response: Response,
+    session_id: Optional[int] = Query(None, description="Class session whose roster is searched first (or X-Session-Id)"),
+    db: Session = Depends(get_db)
+):
+    timings = {}
+    image_data = await _read_image_upload(request, timings)
+    # Kiosks identify themselves with X-Kiosk-Id; otherwise the client address is used
+    kiosk_id = request.headers.get("x-kiosk-id") or (request.client.host if request.client else "unknown")
+    if session_id is None and request.headers.get("x-session-id"):
         try:
-            # Use HOG model which is faster but less accurate, and increase upsample to find smaller faces
-            face_locations = face_recognition.face_locations(image_array, model="hog", number_of_times_to_upsample=2)
-            logger.debug(f"Found {len(face_locations)} faces in image")
-            
-            # If no faces found with HOG, try with the CNN model which is more accurate
-            if not face_locations and image_array.shape[0] <= 1000 and image_array.shape[1] <= 1000:
-                logger.debug("Attempting CNN model for face detection")
-                try:
-                    face_locations = face_recognition.face_locations(image_array, model="cnn")
-                    logger.debug(f"Found {len(face_locations)} faces with CNN model")
-                except Exception as cnn_error:
-                    logger.warning(f"CNN model failed: {str(cnn_error)}")
-            
-            # If still no faces, use a more lenient approach by assuming the entire image is a face
-            if not face_locations:
-                logger.warning("No faces found, using the full image as a face")
-                height, width = image_array.shape[:2]
-                face_locations = [(0, width, height, 0)]  # top, right, bottom, left format
-        except Exception as e:
-            logger.error(f"Error finding face locations: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error detecting faces: {str(e)}")
+            session_id = int(request.headers["x-session-id"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Session-Id must be an integer")
+    # Per-student details are logged only for sampled requests (or X-Trace: 1)
+    traced = trace_sampled(request.headers.get("x-trace") == "1")
+    try:
+        # The session's roster (explicit, or scheduled at this kiosk now) is searched first
+        section_id = _resolve_section(db, session_id, kiosk_id, timings)
         
-        # Get face encoding for the captured image
-        try:
-            face_encodings = face_recognition.face_encodings(image_array, face_locations)
-            logger.debug(f"Generated {len(face_encodings)} face encodings")
-            
-            if not face_encodings:
-                logger.warning("Could not encode face, trying with different parameters")
-                # Try with jitter which helps with different lighting conditions
-                face_encodings = face_recognition.face_encodings(image_array, face_locations, num_jitters=3)
-                logger.debug(f"Generated {len(face_encodings)} face encodings with jitter")
-        except Exception as e:
-            logger.error(f"Error generating face encodings: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error encoding face: {str(e)}")
+        # A kiosk keeps posting frames of the same person: near-identical
+        # frames reuse the previous result instead of detecting again. The
+        # hash decodes the frame, so it runs off the event loop
+        started = time.perf_counter()
+        frame_key = await asyncio.to_thread(frame_hash, image_data)
+        generation = (gallery.generation, roster_index.generation, section_id)
+        match = frame_cache.get(kiosk_id, frame_key, generation)
+        timings["cache"] = (time.perf_counter() - started) * 1000.0
+        response.headers["X-Cache"] = "MISS" if match is MISS else "HIT"
         
-        if not face_encodings:
-            logger.warning("Could not encode face")
-            raise HTTPException(status_code=400, detail="Could not encode face")
+        if match is MISS:
+            match = await _match_probe(image_data, response, timings, db, section_id, traced)
+            frame_cache.put(kiosk_id, frame_key, generation, match)
+        else:
+            if traced:
+                trace_logger.info(f"Kiosk {kiosk_id}: frame cache hit, match {match['id'] if match else None}")
+            if match:
+                response.headers["X-Detection-Stage"] = match["detection_stage"]
+                response.headers["X-Match-Scope"] = match["scope"]
         
-        input_encoding = face_encodings[0]
+        if match is None:
+            OUTCOMES.inc("single", "no_match")
+            raise HTTPException(status_code=404, detail="No matching face found")
         
-        # Get all students with face encodings
+        started = time.perf_counter()
         try:
-            students = db.query(Student).filter(Student.face_encoding.isnot(None)).all()
-            logger.debug(f"Found {len(students)} students with face encodings")
+            marked = _mark_once(db, kiosk_id, match["id"])
         except Exception as e:
-            logger.error(f"Database error when fetching students: {str(e)}")
+            db.rollback()
+            logger.error(f"Error saving attendance record: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        timings["insert"] = (time.perf_counter() - started) * 1000.0
         
-        if not students:
-            logger.warning("No registered students found with face encodings")
-            raise HTTPException(status_code=404, detail="No registered students found")
+        if not marked:
+            OUTCOMES.inc("single", "already_marked")
+            logger.warning(f"Attendance already marked for student {match['id']} today")
+            raise HTTPException(status_code=400, detail="Attendance already marked for today")
         
-        # Find the best match
-        best_match = None
-        best_distance = float('inf')
+        OUTCOMES.inc("single", "marked")
+        logger.info(f"Successfully marked attendance for student {match['id']}")
         
-        for student in students:
-            try:
-                stored_encoding = np.array(json.loads(student.face_encoding))
-                distance = np.linalg.norm(input_encoding - stored_encoding)
-                
-                logger.debug(f"Student {student.id} distance: {distance}")
-                
-                if distance < best_distance:
-                    best_distance = distance
-                    best_match = student
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding face encoding for student {student.id}: {str(e)}")
-                continue
-            except Exception as e:
-                logger.error(f"Error comparing face with student {student.id}: {str(e)}")
-                continue
-        
-        logger.info(f"Best match: {best_match.id if best_match else None}, distance: {best_distance}")
-        
-        # Check if we found a match with a more lenient threshold (0.7 instead of 0.6)
-        if best_match and best_distance < 0.7:  # More lenient threshold for face matching
-            # Get current time in IST
-            current_time = datetime.now(IST)
-            today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            
-            # Check if attendance already marked for today
-            try:
-                existing_attendance = db.query(AttendanceRecord).filter(
-                    AttendanceRecord.student_id == best_match.id,
-                    AttendanceRecord.timestamp >= today_start,
-                    AttendanceRecord.timestamp < today_end
-                ).first()
-                
-                if existing_attendance:
-                    logger.warning(f"Attendance already marked for student {best_match.id} today")
-                    raise HTTPException(status_code=400, detail="Attendance already marked for today")
-            except Exception as e:
-                logger.error(f"Error checking existing attendance: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-            
-            # Create new attendance record with IST timestamp
-            try:
-                attendance = AttendanceRecord(
-                    student_id=best_match.id,
-                    status="present",
-                    timestamp=current_time
-                )
-                db.add(attendance)
-                db.commit()
-                db.refresh(attendance)
-                
-                logger.info(f"Successfully marked attendance for student {best_match.id}")
-                
-                return {
-                    "message": "Attendance marked successfully",
-                    "student_id": best_match.student_id,
-                    "full_name": best_match.full_name
-                }
-            except Exception as e:
-                db.rollback()
-                logger.error(f"Error saving attendance record: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-        else:
-            logger.warning(f"No matching face found. Best distance: {best_distance}")
-            raise HTTPException(status_code=404, detail="No matching face found")
+        _set_server_timing(response, timings)
+        return {
+            "message": "Attendance marked successfully",
+            "student_id": match["student_id"],
+            "full_name": match["full_name"],
+            "detection_stage": match["detection_stage"]
+        }
             
-    except HTTPException:
+    except HTTPException as e:
+        if e.status_code >= 500:
+            OUTCOMES.inc("single", "error")
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
+        OUTCOMES.inc("single", "error")
         logger.error(f"Unexpected error in recognize_face: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        observe_stages(timings)
+        if traced:
+            trace_logger.info(f"Kiosk {kiosk_id}: stage timings {timings}")
+
+async def _match_probe(image_data: bytes, response: Response, timings: dict, db: Session,
+                       section_id: Optional[int] = None, traced: bool = False) -> Optional[dict]:
+    """Detect, encode and match one probe frame; None when no student matches."""
+    # Detect and encode the face in a worker process
+    try:
+        result = await _run_in_pool(encode_probe_face, image_data, timings)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error detecting or encoding face: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error encoding face: {str(e)}")
+    
+    DETECTIONS.inc(result["detector"])
+    response.headers["X-Detection-Stage"] = result["detector"]
+    if result["encoding"] is None:
+        OUTCOMES.inc("single", "no_face")
+        logger.warning("Could not encode face")
+        raise HTTPException(status_code=400, detail="Could not encode face")
+    
+    # Match against the in-memory gallery with one batched distance computation
+    if len(gallery) == 0:
+        OUTCOMES.inc("single", "no_gallery")
+        logger.warning("No registered students found with face encodings")
+        raise HTTPException(status_code=404, detail="No registered students found")
+    
+    # Roster first; the whole gallery only when no roster student is close enough
+    started = time.perf_counter()
+    match_ids, match_distances, scopes = roster_index.search(
+        db, section_id, result["encoding"], MATCH_THRESHOLD, k=TRACE_CANDIDATES if traced else 1
+    )
+    best_distance = float(match_distances[0, 0])
+    timings["match"] = (time.perf_counter() - started) * 1000.0
+    response.headers["X-Match-Scope"] = scopes[0]
+    if traced:
+        trace_logger.info(
+            f"Detected by {result['detector']} at {result['location']}; nearest students ({scopes[0]}): "
+            + ", ".join(f"{student_pk} ({distance:.3f})" for student_pk, distance in zip(
+                match_ids[0].tolist(), match_distances[0].tolist()))
+        )
+    started = time.perf_counter()
+    try:
+        best_match = db.query(Student).filter(Student.id == int(match_ids[0, 0])).first()
+    except Exception as e:
+        logger.error(f"Database error when fetching student: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    timings["db_fetch"] = (time.perf_counter() - started) * 1000.0
+    
+    # Check if we found a match with a more lenient threshold (0.7 instead of 0.6)
+    if best_match and best_distance < MATCH_THRESHOLD:
+        return {
+            "id": best_match.id,
+            "student_id": best_match.student_id,
+            "full_name": best_match.full_name,
+            "detection_stage": result["detector"],
+            "scope": scopes[0]
+        }
+    logger.warning(f"No matching face found. Best distance: {best_distance}")
+    return None
+
+def _mark_once(db: Session, kiosk_id: str, student_pk: int) -> bool:
+    """Mark today's attendance for a recognized student; False if already marked."""
+    # Students this kiosk marked moments ago are answered without the database
+    recent_key = (kiosk_id, student_pk, datetime.now(IST).date())
+    if recent_students.seen(recent_key):
+        logger.debug(f"Student {student_pk} recently marked at kiosk {kiosk_id}")
+        return False
+    if attendance_queue.running:
+        # Write-behind: answered from the in-memory dedupe, inserted by the queue's writer
+        marked = attendance_queue.offer(db, student_pk)
+    else:
+        # Create new attendance record with IST timestamp; the per-day
+        # unique index rejects a second record in the same insert
+        marked = crud.insert_attendance_once(db, student_pk, "present") is not None
+    recent_students.add(recent_key)
+    return marked
+
+@router.get("/cache-stats")
+def get_cache_stats():
+    # Hit/miss counters of the recognition caches since startup
+    return {"frames": frame_cache.stats(), "recent_students": recent_students.stats()}
+
+@router.post("/batch")
+async def recognize_faces_batch(batch_request: BatchImageRequest, response: Response, db: Session = Depends(get_db)):
+    images = list(batch_request.images or [])
+    if batch_request.image:
+        images.insert(0, batch_request.image)
+    if not images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    
+    timings = {}
+    image_datas = []
+    for image_index, image_str in enumerate(images):
+        try:
+            image_datas.append(_decode_base64_image(image_str))
+        except Exception as e:
+            logger.error(f"Error decoding image {image_index}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid image {image_index}: {str(e)}")
+    
+    # Detect and encode every face in every image, images in parallel across workers
+    try:
+        results = await asyncio.gather(*(
+            _run_in_pool(encode_all_faces, image_data, timings) for image_data in image_datas
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing batch images: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error encoding faces: {str(e)}")
+    
+    faces = []
+    encodings = []
+    for image_index, result in enumerate(results):
+        if result["locations"]:
+            DETECTIONS.inc(result["detector"], amount=len(result["locations"]))
+        for (top, right, bottom, left), encoding in zip(result["locations"], result["encodings"]):
+            faces.append({
+                "image_index": image_index,
+                "box": {"top": top, "right": right, "bottom": bottom, "left": left},
+            })
+            encodings.append(encoding)
+    
+    logger.info(f"Batch recognition: {len(faces)} faces in {len(images)} images")
+    if not faces:
+        return {"face_count": 0, "marked_count": 0, "faces": []}
+    
+    # Match all faces in one matrix operation, the session roster first
+    section_id = _resolve_section(db, batch_request.session_id, batch_request.kiosk_id, timings)
+    started = time.perf_counter()
+    match_ids, match_distances, scopes = roster_index.search(db, section_id, np.stack(encodings), MATCH_THRESHOLD)
+    timings["match"] = (time.perf_counter() - started) * 1000.0
+    if match_ids.shape[1] == 0:
+        match_ids = np.full((len(faces), 1), -1, dtype=np.int64)
+        match_distances = np.full((len(faces), 1), np.inf, dtype=np.float32)
+    
+    # When several faces match the same student, only the closest one counts
+    best_face = {}
+    for face_index, (student_pk, distance) in enumerate(zip(match_ids[:, 0].tolist(), match_distances[:, 0].tolist())):
+        faces[face_index]["distance"] = distance if np.isfinite(distance) else None
+        faces[face_index]["scope"] = scopes[face_index]
+        if distance < MATCH_THRESHOLD:
+            current = best_face.get(student_pk)
+            if current is None or distance < faces[current]["distance"]:
+                best_face[student_pk] = face_index
+    
+    current_time = datetime.now(IST)
+    
+    try:
+        students = {
+            student.id: student
+            for student in db.query(Student).filter(Student.id.in_(best_face)).all()
+        }
+        
+        # Insert attendance for every matched student in one transaction;
+        # students already marked today are skipped by the per-day unique index
+        inserted = crud.insert_attendance_ignore_duplicates(db, [
+            {"student_id": student_pk, "status": "present", "timestamp": current_time}
+            for student_pk in students
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database error in batch recognition: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    newly_marked = {student_pk for student_pk, _ in inserted}
+    matched_faces = {face_index: student_pk for student_pk, face_index in best_face.items()}
+    marked_count = 0
+    for face_index, face in enumerate(faces):
+        student = students.get(matched_faces.get(face_index))
+        if student is None:
+            same_student = int(match_ids[face_index, 0]) in students and face_index not in matched_faces
+            face.update(matched=False, status="duplicate_in_batch" if same_student else "unknown")
+            continue
+        if student.id not in newly_marked:
+            status = "already_marked"
+        else:
+            status = "marked"
+            marked_count += 1
+        face.update(matched=True, status=status, student_id=student.student_id, full_name=student.full_name)
+    for face in faces:
+        OUTCOMES.inc("batch", "no_match" if face["status"] == "unknown" else face["status"])
+    
+    _set_server_timing(response, timings)
+    observe_stages(timings)
+    return {"face_count": len(faces), "marked_count": marked_count, "faces": faces}
+
+class _FaceStream:
+    """Recognition state of one WebSocket video stream.
+
+    Faces are detected on every ``config.STREAM_DETECT_EVERY``-th frame and
+    followed between detections by an IoU tracker, so each face is encoded
+    and matched once, when its track appears. A detection frame that
+    arrives while the previous one is still processing is skipped rather
+    than queued, keeping events close to real time.
+    """
+
+    def __init__(self, websocket: WebSocket, kiosk_id: str, session_id: Optional[int] = None):
+        self.websocket = websocket
+        self.kiosk_id = kiosk_id
+        self.session_id = session_id
+        self.tracker = IoUTracker(config.STREAM_TRACK_IOU, config.STREAM_TRACK_MAX_MISSED)
+        self.frames = 0
+        self.detections = 0
+        self.skipped = 0
+        self.encoded = 0
+        self.recognized = 0
+        self._task = None
+
+    def frame(self, image_data: bytes):
+        self.frames += 1
+        if (self.frames - 1) % config.STREAM_DETECT_EVERY:
+            return
+        if self._task is not None and not self._task.done():
+            self.skipped += 1
+            return
+        self._task = asyncio.create_task(self._process(self.frames, image_data))
+
+    async def drain(self):
+        """Wait for the detection in progress, if any."""
+        if self._task is not None:
+            await self._task
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "skipped": self.skipped,
+            "encoded": self.encoded,
+            "recognized": self.recognized,
+            "tracks": len(self.tracker.tracks),
+        }
+
+    async def _process(self, frame: int, image_data: bytes):
+        try:
+            await self._detect_and_identify(frame, image_data)
+        except PoolSaturatedError:
+            self.skipped += 1
+        except (ImageDecodeError, SessionNotFoundError) as e:
+            await self.websocket.send_json({"type": "error", "frame": frame, "detail": str(e)})
+        except Exception as e:
+            logger.error(f"Error processing stream frame {frame}: {str(e)}", exc_info=True)
+            await self.websocket.send_json({"type": "error", "frame": frame, "detail": "Could not process frame"})
+
+    async def _detect_and_identify(self, frame: int, image_data: bytes):
+        result, _ = await face_pool.run(detect_stream_faces, image_data)
+        self.detections += 1
+        observe_stages(result["timings"])
+        if result["locations"]:
+            DETECTIONS.inc(result["detector"], amount=len(result["locations"]))
+        tracks = self.tracker.update([tuple(box) for box in result["locations"]], frame)
+        new_tracks = [track for track in tracks if not track.identified]
+        if not new_tracks:
+            return
+
+        # Only faces that just appeared are encoded, all in one worker call
+        encoded, _ = await face_pool.run(encode_faces_at, image_data, [track.box for track in new_tracks])
+        self.encoded += len(new_tracks)
+        observe_stages(encoded["timings"])
+        for track in new_tracks:
+            track.identified = True
+        if not encoded["encodings"]:
+            return
+
+        # A fresh session per event: the stream may stay open for hours
+        # (and the kiosk's scheduled class session changes meanwhile)
+        db = SessionLocal()
+        try:
+            section_id = resolve_section(db, self.session_id, self.kiosk_id)
+            match_ids, match_distances, scopes = roster_index.search(
+                db, section_id, np.stack(encoded["encodings"]), MATCH_THRESHOLD
+            )
+            if match_ids.shape[1] == 0:
+                match_ids = np.full((len(new_tracks), 1), -1, dtype=np.int64)
+                match_distances = np.full((len(new_tracks), 1), np.inf, dtype=np.float32)
+            candidates = {
+                int(student_pk) for student_pk, distance in zip(match_ids[:, 0], match_distances[:, 0])
+                if distance < MATCH_THRESHOLD
+            }
+            students = {
+                student.id: student
+                for student in db.query(Student).filter(Student.id.in_(candidates)).all()
+            } if candidates else {}
+            for track, student_pk, distance, scope in zip(
+                new_tracks, match_ids[:, 0].tolist(), match_distances[:, 0].tolist(), scopes
+            ):
+                event = {
+                    "track_id": track.track_id,
+                    "frame": frame,
+                    "box": dict(zip(("top", "right", "bottom", "left"), track.box)),
+                    "distance": distance if np.isfinite(distance) else None,
+                    "scope": scope,
+                }
+                student = students.get(student_pk) if distance < MATCH_THRESHOLD else None
+                if student is None:
+                    OUTCOMES.inc("stream", "no_match")
+                    await self.websocket.send_json({"type": "unknown", **event})
+                    continue
+                try:
+                    marked = _mark_once(db, self.kiosk_id, student.id)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error saving attendance record: {str(e)}")
+                    await self.websocket.send_json({"type": "error", "frame": frame, "detail": "Database error"})
+                    continue
+                track.match = {"id": student.id, "student_id": student.student_id, "full_name": student.full_name}
+                self.recognized += 1
+                OUTCOMES.inc("stream", "marked" if marked else "already_marked")
+                await self.websocket.send_json({
+                    "type": "recognized",
+                    **event,
+                    "student_id": student.student_id,
+                    "full_name": student.full_name,
+                    "attendance": "marked" if marked else "already_marked",
+                })
+        finally:
+            db.close()
+
+@router.websocket("/stream")
+async def recognize_stream(websocket: WebSocket, kiosk_id: Optional[str] = None, session_id: Optional[int] = None):
+    """Recognize faces in a stream of binary JPEG/PNG frames.
+
+    Events are pushed as JSON when a tracked face is identified:
+    ``recognized`` (with ``attendance``: ``marked`` or ``already_marked``),
+    ``unknown`` or ``error``. Sending the text message ``stats`` waits for
+    the detection in progress and returns the stream's frame counters.
+    """
+    await websocket.accept()
+    # Browsers cannot set WebSocket headers, so kiosks pass ?kiosk_id= (and ?session_id=)
+    stream = _FaceStream(websocket, kiosk_id or (websocket.client.host if websocket.client else "unknown"), session_id)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                stream.frame(message["bytes"])
+            elif message.get("text") == "stats":
+                await stream.drain()
+                await websocket.send_json({"type": "stats", **stream.stats()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.close()
+        logger.info(f"Recognition stream closed: {stream.stats()}")
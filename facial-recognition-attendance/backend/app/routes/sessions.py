@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from .. import crud, schemas
+from ..database import get_db
+from ..rosters import resolve_section, roster_index
+
+router = APIRouter()
+
+@router.post("/courses/", response_model=schemas.Course)
+def create_course(course: schemas.CourseCreate, db: Session = Depends(get_db)):
+    if crud.get_course_by_code(db, course.code):
+        raise HTTPException(status_code=400, detail="Course code already exists")
+    return crud.create_course(db, course)
+
+@router.get("/courses/", response_model=List[schemas.Course])
+def read_courses(db: Session = Depends(get_db)):
+    return crud.get_courses(db)
+
+@router.post("/courses/{course_id}/sections/", response_model=schemas.Section)
+def create_section(course_id: int, section: schemas.SectionCreate, db: Session = Depends(get_db)):
+    return crud.create_section(db, course_id, section)
+
+@router.get("/sections/{section_id}/roster", response_model=List[schemas.Student])
+def read_roster(section_id: int, db: Session = Depends(get_db)):
+    return crud.get_section(db, section_id).students
+
+@router.put("/sections/{section_id}/roster", response_model=Dict)
+def replace_roster(section_id: int, roster: schemas.RosterUpdate, db: Session = Depends(get_db)):
+    # Recognition at this section's sessions matches against these students first
+    student_count = crud.set_section_roster(db, section_id, roster.student_ids)
+    return {"section_id": section_id, "student_count": student_count}
+
+@router.post("/sections/{section_id}/sessions/", response_model=schemas.ClassSession)
+def create_class_session(section_id: int, class_session: schemas.ClassSessionCreate, db: Session = Depends(get_db)):
+    return crud.create_class_session(db, section_id, class_session)
+
+@router.get("/sections/{section_id}/sessions/", response_model=List[schemas.ClassSession])
+def read_class_sessions(section_id: int, db: Session = Depends(get_db)):
+    crud.get_section(db, section_id)
+    return crud.get_class_sessions(db, section_id)
+
+@router.get("/kiosks/{kiosk_id}/roster", response_model=Dict)
+def read_kiosk_roster(kiosk_id: str, db: Session = Depends(get_db)):
+    # Which roster a scan at this kiosk would search first right now
+    section_id: Optional[int] = resolve_section(db, kiosk_id=kiosk_id)
+    if section_id is None:
+        return {"kiosk_id": kiosk_id, "section_id": None, "encodings": 0}
+    return {"kiosk_id": kiosk_id, "section_id": section_id, "encodings": len(roster_index.matcher(db, section_id))}
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
 from sqlalchemy.orm import Session
 from typing import List
-from .. import crud, schemas
+import asyncio
+import zipfile
+from .. import crud, schemas, enrollment
 from ..database import get_db, engine
 from ..models import Base
+from ..gallery import gallery
+from ..executor import face_pool
+from ..recognition_cache import frame_cache, recent_students
+from ..rosters import roster_index
+from ..attendance_queue import attendance_queue
 
 router = APIRouter()
 
@@ -14,6 +21,30 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)
         raise HTTPException(status_code=400, detail="Student ID already registered")
     return crud.create_student(db=db, student=student)
 
+@router.post("/students/bulk", response_model=schemas.BulkEnrollmentResult)
+async def bulk_enroll_students(
+    roster: UploadFile = File(..., description="CSV with student_id, full_name and optional photo columns"),
+    photos: UploadFile = File(..., description="ZIP archive of student photos"),
+    db: Session = Depends(get_db)
+):
+    # Parsing, ZIP reads and the batched inserts run in threads, so kiosks
+    # are not stalled while an intake of thousands of students is imported
+    report = enrollment.EnrollmentReport()
+    try:
+        roster_text = (await roster.read()).decode("utf-8-sig")
+        entries = await asyncio.to_thread(enrollment.parse_roster, roster_text, report)
+        photo_source = await asyncio.to_thread(enrollment.PhotoSource, photos.file)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        jobs = await asyncio.to_thread(enrollment.plan_enrollment, db, entries, photo_source, report)
+        encoded = await enrollment.encode_with_pool(face_pool, jobs, photo_source, report)
+        await asyncio.to_thread(enrollment.store_enrollments, db, encoded, report)
+    finally:
+        photo_source.close()
+    return report.as_dict()
+
 @router.get("/students/", response_model=List[schemas.Student])
 def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     students = crud.get_students(db, skip=skip, limit=limit)
@@ -37,6 +68,11 @@ def reset_database():
         Base.metadata.drop_all(bind=engine)
         # Create all tables
         Base.metadata.create_all(bind=engine)
+        gallery.clear()
+        frame_cache.clear()
+        recent_students.clear()
+        roster_index.invalidate()
+        attendance_queue.clear()
         return {"message": "Database reset successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -18,6 +18,16 @@ class Student(StudentBase):
     class Config:
         from_attributes = True
 
+class BulkEnrollmentFailure(BaseModel):
+    row: int
+    student_id: Optional[str] = None
+    error: str
+
+class BulkEnrollmentResult(BaseModel):
+    total_rows: int
+    enrolled: int
+    failed: List[BulkEnrollmentFailure]
+
 class AttendanceRecordBase(BaseModel):
     status: str
 
@@ -32,5 +42,56 @@ class AttendanceRecord(AttendanceRecordBase):
     class Config:
         from_attributes = True
 
+class BulkAttendanceItem(BaseModel):
+    student_id: int
+    status: str = "present"
+    timestamp: Optional[datetime] = None  # defaults to now; naive times are IST
+
+class BulkAttendanceRequest(BaseModel):
+    records: List[BulkAttendanceItem] = Field(..., min_length=1, max_length=5000)
+
+class AttendancePage(BaseModel):
+    records: List[AttendanceRecord]
+    next_cursor: Optional[str] = None
+
 class FaceRecognitionRequest(BaseModel):
-    face_encoding: List[float] 
\ No newline at end of file
+    face_encoding: List[float]
+    # Search this session's roster first (or the session active at the kiosk)
+    session_id: Optional[int] = None
+    kiosk_id: Optional[str] = None
+
+class CourseCreate(BaseModel):
+    code: str
+    name: str
+
+class Course(CourseCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+class SectionCreate(BaseModel):
+    name: str
+
+class Section(SectionCreate):
+    id: int
+    course_id: int
+
+    class Config:
+        from_attributes = True
+
+class RosterUpdate(BaseModel):
+    student_ids: List[int]  # Student.id values; replaces the whole roster
+
+class ClassSessionCreate(BaseModel):
+    starts_at: datetime  # naive times are IST
+    ends_at: datetime
+    kiosk_id: Optional[str] = None
+
+class ClassSession(ClassSessionCreate):
+    id: int
+    section_id: int
+
+    class Config:
+        from_attributes = True
+
@@ -0,0 +1,217 @@
+"""Encoding gallery shared by every server process through memory-mapped files.
+
+With several uvicorn/gunicorn workers each process would otherwise hold
+(and reload) its own copy of the encodings, and enrollments made through
+one worker would be invisible to the others. Here the gallery is published
+to ``<directory>/gallery-<version>.bin`` (ids, float32 matrix and squared
+norms) and the current version is kept in an 8-byte ``version`` file.
+Workers map the published file read-only, so the page cache holds one copy
+for all of them, and remap lazily when the version moves on.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+import numpy as np
+from .matching import Matcher, _squared_distances, _top_k, _empty_result
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FGAL"
+# magic, dim, count
+HEADER = struct.Struct("<4sIQ")
+
+
+class SharedCounter:
+    """A 64-bit counter in an 8-byte file mapped by every server process.
+
+    Reading it is one load from a shared page; ``increment`` serializes
+    writers on a ``flock`` of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(path) != 8:
+                    f.truncate(0)
+                    f.write(struct.pack("<Q", 0))
+                    f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        with open(path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), 8)
+
+    @property
+    def value(self) -> int:
+        return struct.unpack_from("<Q", self._map)[0]
+
+    def set(self, value: int):
+        # Callers serialize writes themselves
+        struct.pack_into("<Q", self._map, 0, value)
+
+    def increment(self) -> int:
+        with open(self.path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                value = self.value + 1
+                self.set(value)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return value
+
+
+def _gallery_path(directory: str, version: int) -> str:
+    return os.path.join(directory, f"gallery-{version}.bin")
+
+
+def _map_gallery(path: str, dim: int):
+    """Zero-copy (ids, matrix, sq_norms) views of a published gallery file."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, file_dim, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC or file_dim != dim:
+        raise ValueError(f"{path} is not a {dim}-dimensional gallery file")
+    offset = HEADER.size
+    ids = np.frombuffer(buffer, dtype=np.int64, count=count, offset=offset)
+    offset += ids.nbytes
+    matrix = np.frombuffer(buffer, dtype=np.float32, count=count * dim, offset=offset).reshape(count, dim)
+    offset += matrix.nbytes
+    sq_norms = np.frombuffer(buffer, dtype=np.float32, count=count, offset=offset)
+    return ids, matrix, sq_norms
+
+
+class SharedMatcher(Matcher):
+    """Exact search over a gallery published for all server processes.
+
+    Writers serialize on a ``flock`` of ``<directory>/lock``, start from the
+    latest published gallery (another worker may have changed it), write
+    the next version to a new file and then bump the version counter.
+    Searches compare the mapped version with the counter (one read of a
+    shared page) and remap the new file when it changed; they never take
+    the lock.
+    """
+
+    name = "shared"
+
+    def __init__(self, dim: int, directory: str):
+        super().__init__(dim)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._version = SharedCounter(os.path.join(directory, "version"))
+        self._snapshot = self._empty(-1)
+        self.remaps = 0
+
+    def _empty(self, version: int):
+        return (
+            version, np.empty(0, dtype=np.int64),
+            np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=np.float32)
+        )
+
+    @property
+    def version(self) -> int:
+        """Version last published by any process."""
+        return self._version.value
+
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.directory, "lock"), "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current(self):
+        """The snapshot for the published version, remapping when it moved on."""
+        snapshot = self._snapshot
+        version = self.version
+        if snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            while self._snapshot[0] != self.version:
+                version = self.version
+                if version == 0:
+                    self._snapshot = self._empty(0)
+                    break
+                try:
+                    self._snapshot = (version, *_map_gallery(_gallery_path(self.directory, version), self.dim))
+                except FileNotFoundError:
+                    if self.version != version:
+                        # Superseded and deleted between reading the version and opening it
+                        continue
+                    logger.warning(f"Shared gallery file for version {version} is missing")
+                    self._snapshot = self._empty(version)
+                    break
+                self.remaps += 1
+            return self._snapshot
+
+    def _publish(self, ids: np.ndarray, matrix: np.ndarray):
+        # Caller holds the file lock
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix).astype(np.float32)
+        previous = self.version
+        version = previous + 1
+        path = _gallery_path(self.directory, version)
+        with open(path + ".tmp", "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.dim, len(ids)))
+            f.write(ids.tobytes())
+            f.write(matrix.tobytes())
+            f.write(sq_norms.tobytes())
+        os.replace(path + ".tmp", path)
+        self._version.set(version)
+        # Processes still searching the old file keep their mapping
+        try:
+            os.remove(_gallery_path(self.directory, previous))
+        except OSError:
+            pass
+        logger.debug(f"Published shared gallery version {version} with {len(ids)} encodings")
+
+    def __len__(self):
+        return len(self._current()[1])
+
+    def build(self, ids, matrix):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._file_lock():
+            # Every worker loads the gallery at startup; only the first
+            # needs to publish it
+            _, current_ids, current_matrix, _ = self._current()
+            if np.array_equal(current_ids, ids) and np.array_equal(current_matrix, matrix):
+                return
+            self._publish(ids, matrix)
+
+    def add(self, student_id, vector):
+        self.add_many(np.asarray([student_id], dtype=np.int64), np.asarray(vector).reshape(1, self.dim))
+
+    def add_many(self, ids, matrix):
+        new_ids = np.asarray(ids, dtype=np.int64)
+        new_matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._file_lock():
+            _, ids, matrix, _ = self._current()
+            keep = ~np.isin(ids, new_ids)
+            self._publish(np.concatenate([ids[keep], new_ids]), np.concatenate([matrix[keep], new_matrix]))
+
+    def remove(self, student_id):
+        with self._file_lock():
+            _, ids, matrix, _ = self._current()
+            keep = ids != student_id
+            if keep.all():
+                return
+            self._publish(ids[keep], matrix[keep])
+
+    def search(self, queries, k=1):
+        _, ids, matrix, sq_norms = self._current()
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, len(ids))
+        if k == 0:
+            return _empty_result(len(queries))
+        top, top_sq = _top_k(_squared_distances(queries, matrix, sq_norms), k)
+        return ids[top], np.sqrt(top_sq)
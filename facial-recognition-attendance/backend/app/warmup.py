@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+import numpy as np
+from .database import SessionLocal
+from .gallery import gallery
+from .executor import face_pool
+from .face_pipeline import blank_jpeg, warm_up as warm_up_worker
+from .recognition_cache import frame_hash
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Startup progress, served by /health/ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.stage = "starting"
+        self.error = None
+        self.timings = {}  # warm-up stage -> milliseconds
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000.0, 1)
+        self._last = now
+
+    def as_dict(self) -> dict:
+        return {"ready": self.ready, "stage": self.stage, "error": self.error, "timings_ms": self.timings}
+
+
+readiness = Readiness()
+
+
+def load_gallery():
+    db = SessionLocal()
+    try:
+        gallery.load(db)
+    finally:
+        db.close()
+
+
+async def prime_gallery(state: Readiness = readiness):
+    """Load the encoding gallery; awaited before the server takes requests."""
+    state.stage = "gallery"
+    await asyncio.to_thread(load_gallery)
+    state.lap("gallery")
+
+
+async def warm_up(state: Readiness = readiness):
+    """Prime everything else the first kiosk scan would otherwise wait for.
+
+    Starts the face workers and runs a dummy detect + encode on each of
+    them (model loading and dlib first-call overhead), then exercises the
+    in-process frame hash and gallery search.
+    """
+    try:
+        if config.STARTUP_WARMUP:
+            state.stage = "face_workers"
+            face_pool.start()
+            # One job per worker; each takes long enough that an idle worker
+            # picks up the next one rather than the same worker running them all
+            await asyncio.gather(*(face_pool.run(warm_up_worker) for _ in range(face_pool.max_workers)))
+            state.lap("face_workers")
+
+            state.stage = "matching"
+            # In a thread like the requests' hashing (it imports OpenCV)
+            await asyncio.to_thread(lambda: frame_hash(blank_jpeg()))
+            if len(gallery):
+                gallery.search(np.zeros(gallery.dim, dtype=np.float32), k=1)
+            state.lap("matching")
+
+        state.stage = "ready"
+        state.ready = True
+        logger.info(f"Warm-up finished: {state.timings}")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        state.stage = "failed"
+        state.error = str(e)
+        logger.error(f"Warm-up failed: {str(e)}", exc_info=True)
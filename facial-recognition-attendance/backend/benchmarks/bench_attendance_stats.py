@@ -0,0 +1,130 @@
+"""Server-side aggregation vs downloading every record to the browser.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_attendance_stats --students 5000 --days 365
+
+Builds a synthetic year of attendance in a scratch SQLite database (school
+days only, ~90% present, ~5% late), then compares:
+
+- full download: every attendance record plus every student serialized as
+  the JSON the calendar/stats pages aggregate client-side today;
+- aggregates: GET /api/attendance/calendar for one month plus
+  GET /api/attendance/student-stats for the whole year.
+
+Reports response bytes and server time (query + JSON encoding).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, create_db_engine
+from app.models import IST, AttendanceRecord, DailyAttendanceSummary, Student
+from app.attendance_stats import month_grid, student_stats
+from app import schemas
+
+BATCH_SIZE = 50000
+
+
+def populate(db, students: int, days: int, end: date, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    db.execute(insert(Student), [
+        {"id": i + 1, "student_id": f"S{i + 1:05d}", "full_name": f"Student {i + 1}"}
+        for i in range(students)
+    ])
+    school_days = [
+        end - timedelta(days=offset) for offset in range(days - 1, -1, -1)
+        if (end - timedelta(days=offset)).weekday() < 5
+    ]
+    summary = {}
+    batch = []
+    for day in school_days:
+        rolls = rng.random(students)
+        minutes = rng.integers(0, 90, students)
+        for index in np.flatnonzero(rolls < 0.9):
+            status = "late" if rolls[index] < 0.05 else "present"
+            timestamp = datetime(day.year, day.month, day.day, 8, 30, tzinfo=IST) + timedelta(minutes=int(minutes[index]))
+            batch.append({
+                "student_id": int(index) + 1,
+                "timestamp": timestamp,
+                "attendance_date": day,
+                "status": status
+            })
+            summary[(day, status)] = summary.get((day, status), 0) + 1
+        if len(batch) >= BATCH_SIZE:
+            db.execute(insert(AttendanceRecord), batch)
+            batch = []
+    if batch:
+        db.execute(insert(AttendanceRecord), batch)
+    db.execute(insert(DailyAttendanceSummary), [
+        {"date": day, "status": status, "count": count} for (day, status), count in summary.items()
+    ])
+    db.commit()
+    return len(school_days)
+
+
+def full_download(db) -> bytes:
+    records = db.query(AttendanceRecord).all()
+    students = db.query(Student).all()
+    body = TypeAdapter(List[schemas.AttendanceRecord]).dump_json(records)
+    body += TypeAdapter(List[schemas.Student]).dump_json(students)
+    db.expunge_all()
+    return body
+
+
+def aggregates(db, start: date, end: date) -> bytes:
+    grid = month_grid(db, end.year, end.month)
+    stats = student_stats(db, start, end)
+    return json.dumps(grid).encode() + json.dumps(stats).encode()
+
+
+def measure(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        body = fn()
+        samples.append(time.perf_counter() - began)
+    return len(body), float(np.median(samples)) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="attendance-bench-"), "stats.db")
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    end = date.today()
+    start = end - timedelta(days=args.days - 1)
+    began = time.perf_counter()
+    school_days = populate(db, args.students, args.days, end)
+    records = db.query(AttendanceRecord).count()
+    print(f"{records} records, {args.students} students, {school_days} school days "
+          f"(generated in {time.perf_counter() - began:.1f}s)")
+
+    print(f"{'approach':<16}{'bytes':>14}{'ms':>10}")
+    for name, fn in (
+        ("full download", lambda: full_download(db)),
+        ("aggregates", lambda: aggregates(db, start, end)),
+    ):
+        size, ms = measure(fn, args.repeat)
+        print(f"{name:<16}{size:>14,}{ms:>10.0f}")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
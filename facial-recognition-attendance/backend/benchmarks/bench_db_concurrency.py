@@ -0,0 +1,87 @@
+"""Attendance inserts/sec with N parallel clients.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_db_concurrency --clients 1 4 16 --inserts 200
+    python -m benchmarks.bench_db_concurrency --url postgresql://.../bench
+
+Each client is a thread with its own session marking attendance through
+crud.insert_attendance_once (one transaction per scan, like a kiosk). For
+SQLite, a scratch database is benchmarked with the default pysqlite
+settings ("untuned") and with the pragmas from database.create_db_engine
+("tuned"). Lock errors are counted rather than aborting the run.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, create_db_engine
+from app.models import IST
+from app import crud
+
+
+def run_clients(engine, clients: int, inserts: int, offset: int):
+    Session = sessionmaker(bind=engine)
+    errors = []
+    start_barrier = threading.Barrier(clients)
+    day = datetime.now(IST).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    def client(number: int):
+        db = Session()
+        start_barrier.wait()
+        try:
+            for i in range(inserts):
+                student_id = offset + number * inserts + i
+                try:
+                    crud.insert_attendance_once(db, student_id, "present", day + timedelta(seconds=i))
+                except OperationalError as e:
+                    db.rollback()
+                    errors.append(str(e.orig))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    written = clients * inserts - len(errors)
+    return written / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--inserts", type=int, default=200, help="inserts per client")
+    parser.add_argument("--url", help="database URL to benchmark instead of scratch SQLite files")
+    args = parser.parse_args()
+
+    if args.url:
+        variants = {"configured": lambda: create_db_engine(args.url)}
+    else:
+        scratch = tempfile.mkdtemp(prefix="attendance-bench-")
+        variants = {
+            "untuned": lambda: create_db_engine(f"sqlite:///{os.path.join(scratch, 'untuned.db')}", tune_sqlite=False),
+            "tuned": lambda: create_db_engine(f"sqlite:///{os.path.join(scratch, 'tuned.db')}"),
+        }
+
+    print(f"{'engine':<12}{'clients':>8}{'inserts/s':>12}{'errors':>8}")
+    for name, make_engine in variants.items():
+        engine = make_engine()
+        Base.metadata.create_all(bind=engine)
+        offset = 0
+        for clients in args.clients:
+            rate, errors = run_clients(engine, clients, args.inserts, offset)
+            offset += clients * args.inserts
+            print(f"{name:<12}{clients:>8}{rate:>12.0f}{errors:>8}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Recall and latency of the face matchers against the exact scan.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_matcher --students 50000 --queries 500
+
+Encodings are synthetic: identities are spread around a set of "population"
+centres (real dlib embeddings are clustered, not uniform) and each probe is
+an enrolled identity plus capture noise.
+"""
+import argparse
+import time
+import numpy as np
+from app.gallery import ENCODING_DIM
+from app.matching import BruteForceMatcher, IVFMatcher
+
+
+def synthetic_gallery(num_students: int, num_queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 0.07, size=(64, ENCODING_DIM))
+    identities = (
+        centres[rng.integers(0, len(centres), num_students)]
+        + rng.normal(0.0, 0.06, size=(num_students, ENCODING_DIM))
+    ).astype(np.float32)
+    truth = rng.integers(0, num_students, num_queries)
+    probes = (identities[truth] + rng.normal(0.0, 0.025, size=(num_queries, ENCODING_DIM))).astype(np.float32)
+    return identities, probes
+
+
+def time_search(matcher, probes: np.ndarray, batch: int):
+    results = []
+    latencies = []
+    for start in range(0, len(probes), batch):
+        chunk = probes[start:start + batch]
+        began = time.perf_counter()
+        ids, _ = matcher.search(chunk, k=1)
+        latencies.append((time.perf_counter() - began) / len(chunk))
+        results.append(ids[:, 0])
+    return np.concatenate(results), np.asarray(latencies) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1, help="probes per search call")
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    identities, probes = synthetic_gallery(args.students, args.queries)
+    ids = np.arange(len(identities), dtype=np.int64)
+
+    exact = BruteForceMatcher(ENCODING_DIM)
+    exact.build(ids, identities)
+    truth, latencies = time_search(exact, probes, args.batch)
+    print(f"{args.students} students, {args.queries} queries, batch {args.batch}")
+    print(f"{'matcher':<16}{'recall@1':>10}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{np.percentile(latencies, 50):>10.3f}"
+          f"{np.percentile(latencies, 95):>10.3f}{0.0:>10.2f}")
+
+    ivf = IVFMatcher(ENCODING_DIM, n_lists=args.lists, min_train_size=0)
+    began = time.perf_counter()
+    ivf.build(ids, identities)
+    build_seconds = time.perf_counter() - began
+    for n_probe in args.probes:
+        ivf.n_probe = n_probe
+        found, latencies = time_search(ivf, probes, args.batch)
+        recall = float(np.mean(found == truth))
+        print(f"{'ivf/' + str(n_probe):<16}{recall:>10.3f}{np.percentile(latencies, 50):>10.3f}"
+              f"{np.percentile(latencies, 95):>10.3f}{build_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Memory, latency and match decisions of each gallery precision vs float64.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_precision --students 100000 --queries 500
+    python -m benchmarks.bench_precision --database app.db
+
+The reference is the float64 scan (what the encodings looked like before
+they were stored as float32). For every GALLERY_PRECISION, with and
+without the float32 re-rank, it reports the bytes scanned per search and
+kept for re-ranking, per-probe latency, and how many probes get a
+different match decision than the reference at the 0.6 and 0.7
+thresholds (a different student, or matched vs unmatched). Half of the
+probes are enrolled students plus capture noise, half are people held out
+of the gallery. With --database the gallery is the enrolled encodings of
+that SQLite database instead of synthetic ones.
+"""
+import argparse
+import numpy as np
+from app.gallery import ENCODING_DIM
+from app.matching import PRECISIONS, QuantizedMatcher
+from benchmarks.bench_matcher import synthetic_gallery, time_search
+
+THRESHOLDS = (0.6, 0.7)
+
+
+def database_encodings(path: str) -> np.ndarray:
+    from sqlalchemy import create_engine
+    from app.face_codec import unpack_encoding
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            "SELECT face_encoding FROM students WHERE face_encoding IS NOT NULL"
+        ).all()
+    engine.dispose()
+    return np.stack([unpack_encoding(blob) for (blob,) in rows]).astype(np.float32)
+
+
+def split_probes(population: np.ndarray, num_queries: int, seed: int = 0):
+    """Gallery plus probes: enrolled people and held-out (not enrolled) ones, with capture noise."""
+    rng = np.random.default_rng(seed)
+    num_strangers = min(num_queries // 2, len(population) // 4)
+    order = rng.permutation(len(population))
+    identities, strangers = population[order[num_strangers:]], population[order[:num_strangers]]
+    truth = rng.integers(0, len(identities), num_queries - num_strangers)
+    probes = np.concatenate([identities[truth], strangers])
+    probes = probes + rng.normal(0.0, 0.025, size=probes.shape)
+    return identities, probes.astype(np.float32), num_strangers
+
+
+def reference_search(identities: np.ndarray, probes: np.ndarray, batch: int = 256):
+    """Nearest student and distance per probe, all in float64."""
+    gallery = identities.astype(np.float64)
+    sq_norms = np.einsum("ij,ij->i", gallery, gallery)
+    best_ids = []
+    best_distances = []
+    for start in range(0, len(probes), batch):
+        chunk = probes[start:start + batch].astype(np.float64)
+        sq_dist = np.einsum("ij,ij->i", chunk, chunk)[:, None] + sq_norms[None, :] - 2.0 * chunk @ gallery.T
+        nearest = np.argmin(sq_dist, axis=1)
+        best_ids.append(nearest)
+        best_distances.append(np.sqrt(np.maximum(sq_dist[np.arange(len(chunk)), nearest], 0.0)))
+    return np.concatenate(best_ids), np.concatenate(best_distances)
+
+
+def decisions(ids: np.ndarray, distances: np.ndarray, threshold: float) -> np.ndarray:
+    return np.where(distances < threshold, ids, -1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1, help="probes per search call")
+    parser.add_argument("--rerank", type=int, default=16, help="shortlist re-scored in float32")
+    parser.add_argument("--database", help="SQLite database whose enrolled encodings form the gallery")
+    args = parser.parse_args()
+
+    if args.database:
+        population = database_encodings(args.database)
+    else:
+        population, _ = synthetic_gallery(args.students + args.queries // 2, 1)
+    identities, probes, num_strangers = split_probes(population, args.queries)
+    ids = np.arange(len(identities), dtype=np.int64)
+
+    reference_ids, reference_distances = reference_search(identities, probes)
+    reference = {threshold: decisions(reference_ids, reference_distances, threshold) for threshold in THRESHOLDS}
+    print(f"{len(identities)} students, {len(probes)} probes ({num_strangers} not enrolled), "
+          f"batch {args.batch}; disagreements are vs the float64 scan")
+    print(f"{'precision':<14}{'scan MB':>9}{'rerank MB':>11}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'max |d| err':>13}" + "".join(f"{'@' + str(threshold):>7}" for threshold in THRESHOLDS))
+
+    for precision in PRECISIONS:
+        for rerank in ((0, args.rerank) if precision in ("float16", "int8") and args.rerank else (0,)):
+            matcher = QuantizedMatcher(ENCODING_DIM, precision, rerank=rerank)
+            matcher.build(ids, identities)
+            memory = matcher.memory_usage()
+            found, latencies = time_search(matcher, probes, args.batch)
+            _, distances = matcher.search(probes, k=1)
+            distances = distances[:, 0].astype(np.float64)
+            error = np.max(np.abs(distances - reference_distances))
+            disagreements = [
+                int(np.sum(decisions(found, distances, threshold) != reference[threshold]))
+                for threshold in THRESHOLDS
+            ]
+            label = precision + (f"+rr{rerank}" if rerank else "")
+            print(f"{label:<14}{memory['scan'] / 2**20:>9.1f}{memory['rerank'] / 2**20:>11.1f}"
+                  f"{np.percentile(latencies, 50):>9.3f}{np.percentile(latencies, 95):>9.3f}{error:>13.2e}"
+                  + "".join(f"{count:>7}" for count in disagreements))
+
+
+if __name__ == "__main__":
+    main()
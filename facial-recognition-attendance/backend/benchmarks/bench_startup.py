@@ -0,0 +1,104 @@
+"""Cold start: time until the API answers, until it is ready, and the first scan.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_startup --repeat 3 --workers 2
+
+Every measurement runs in a fresh interpreter against a scratch SQLite
+database, once with STARTUP_WARMUP=false (models load on the first scan)
+and once with it on (the first scan waits for /health/ready). Reported,
+as medians in milliseconds from the start of `import app.main`:
+
+- import: importing the app, and which heavy modules that pulled in;
+- api: until lifespan startup is done and GET /api/students/ answers;
+- ready: until /health/ready returns 200;
+- first scan / second scan: latency of the first two recognize requests.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ("cv2", "PIL.Image", "face_recognition", "dlib", "pyarrow")
+
+
+def child(warmup: bool):
+    began = time.perf_counter()
+    import app.main
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    import numpy as np
+    from app.face_pipeline import import_image_libraries
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    import_image_libraries()
+    from app.face_pipeline import cv2
+
+    def frame(seed: int) -> bytes:
+        # Distinct noise per scan so the recognition cache cannot answer
+        pixels = np.random.default_rng(seed).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        return cv2.imencode(".jpg", pixels)[1].tobytes()
+
+    frames = [frame(1), frame(2)]
+    result = {"import": (imported - began) * 1000.0, "import_loaded": loaded}
+    with TestClient(app.main.app) as client:
+        client.get("/api/students/")
+        result["api"] = (time.perf_counter() - began) * 1000.0
+        if warmup:
+            while client.get("/health/ready").status_code != 200:
+                time.sleep(0.01)
+        result["ready"] = (time.perf_counter() - began) * 1000.0
+        for name, data in zip(("first_scan", "second_scan"), frames):
+            started = time.perf_counter()
+            client.post("/api/face-recognition/", content=data, headers={"content-type": "image/jpeg"})
+            result[name] = (time.perf_counter() - started) * 1000.0
+    print(json.dumps(result))
+
+
+def measure(warmup: bool, workers: int, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/bench_startup.db",
+            STARTUP_WARMUP="true" if warmup else "false",
+            FACE_WORKERS=str(workers),
+        )
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", "on" if warmup else "off"],
+            env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    summary = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import", "api", "ready", "first_scan", "second_scan")
+    }
+    summary["import_loaded"] = runs[0]["import_loaded"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2, help="FACE_WORKERS for the measured app")
+    parser.add_argument("--child", choices=["on", "off"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child == "on")
+        return
+
+    print(f"{'warm-up':<9}{'import':>9}{'api':>9}{'ready':>9}{'1st scan':>10}{'2nd scan':>10}   heavy modules after import")
+    for warmup in (False, True):
+        summary = measure(warmup, args.workers, args.repeat)
+        print(
+            f"{'on' if warmup else 'off':<9}{summary['import']:>9.0f}{summary['api']:>9.0f}{summary['ready']:>9.0f}"
+            f"{summary['first_scan']:>10.0f}{summary['second_scan']:>10.0f}   {', '.join(summary['import_loaded']) or 'none'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Replay a recorded video through the WebSocket recognition stream.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_stream kiosk.mp4
+    python -m benchmarks.bench_stream kiosk.mp4 --realtime --detect-every 3 --width 640
+
+The app runs in-process (with its face worker pool) against a scratch
+SQLite database unless --database is given, so nobody's attendance is
+marked. Each video frame is JPEG-encoded and sent as a binary message to
+/api/face-recognition/stream, as fast as the server accepts them or, with
+--realtime, at the video's own frame rate. Reports the frames/sec the
+stream sustained, how many detections ran or were skipped, how many faces
+were encoded and the recognition events received.
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+import cv2
+
+
+def read_frames(path: str, width: int, quality: int):
+    """JPEG bytes of every frame, resized to ``width`` (0 = as recorded)."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Cannot open video {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        if width and frame.shape[1] != width:
+            frame = cv2.resize(frame, (width, round(frame.shape[0] * width / frame.shape[1])), interpolation=cv2.INTER_AREA)
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    capture.release()
+    return frames, fps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="Recorded video file (anything OpenCV can read)")
+    parser.add_argument("--database", help="Database URL with enrolled students (default: empty scratch SQLite)")
+    parser.add_argument("--detect-every", type=int, help="Detect every Nth frame (default: STREAM_DETECT_EVERY)")
+    parser.add_argument("--width", type=int, default=0, help="Resize frames to this width before sending")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of the sent frames")
+    parser.add_argument("--realtime", action="store_true", help="Send at the video's frame rate")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    os.environ["DATABASE_URL"] = args.database or f"sqlite:///{tempfile.mkdtemp()}/bench_stream.db"
+    if args.detect_every:
+        os.environ["STREAM_DETECT_EVERY"] = str(args.detect_every)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app import config
+
+    frames, fps = read_frames(args.video, args.width, args.quality)
+    print(f"{len(frames)} frames at {fps:.1f} fps, {sum(map(len, frames)) / max(len(frames), 1) / 1024:.0f} KB per JPEG, "
+          f"detecting every {config.STREAM_DETECT_EVERY}")
+
+    events = []
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/face-recognition/stream?kiosk_id=bench") as websocket:
+            began = time.perf_counter()
+            for index, frame in enumerate(frames):
+                if args.realtime:
+                    delay = began + index / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                websocket.send_bytes(frame)
+            websocket.send_text("stats")
+            while True:
+                event = websocket.receive_json()
+                if event["type"] == "stats":
+                    break
+                events.append(event)
+            elapsed = time.perf_counter() - began
+
+    print(f"{event['frames']} frames in {elapsed:.2f} s: {event['frames'] / elapsed:.1f} frames/sec")
+    print(f"detections run: {event['detections']}, skipped while busy: {event['skipped']}, "
+          f"faces encoded: {event['encoded']}")
+    counts = Counter(event["type"] for event in events)
+    print("events: " + (", ".join(f"{name} {count}" for name, count in sorted(counts.items())) or "none"))
+    for event in events:
+        if event["type"] == "recognized":
+            print(f"  frame {event['frame']}: track {event['track_id']} {event['full_name']} ({event['attendance']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Latency and throughput of the recognition and attendance endpoints.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_suite --students 100 1000 10000 100000
+    python -m benchmarks.bench_suite --compare benchmarks/results/a1b2c3d.json benchmarks/results/e4f5a6b.json
+
+Runs offline on CPU. The app is driven in-process (TestClient, with its
+face worker pool) against a scratch SQLite database. For each gallery size
+it generates:
+
+- N students with random 128-d encodings (clustered like real embeddings,
+  see bench_matcher.synthetic_gallery);
+- a year of attendance, ending yesterday, for the first
+  --attendance-students students;
+- synthetic face images (drawn faces, re-rendered with noise per request).
+
+and then measures, each over --requests requests:
+
+- encode_face: POST /api/face-recognition/encode with the face images;
+  faces that encode are enrolled as the first students;
+- recognize_face: POST /api/face-recognition/ with fresh renders of them;
+- mark_attendance_by_face: POST /api/attendance/face-recognition/ with
+  noisy copies of enrolled encodings;
+- get_analytics: GET /api/attendance/analytics?days=30.
+
+Reports p50/p95/p99 latency, throughput, response status counts and,
+from the Server-Timing header, p50/p95/p99 per stage. Results are written
+to JSON (default benchmarks/results/<git commit>.json) for --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import numpy as np
+
+BATCH_SIZE = 10000
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(samples) -> dict:
+    values = np.percentile(np.asarray(samples, dtype=np.float64), PERCENTILES) if len(samples) else [None] * 3
+    return {f"p{p}": (round(float(v), 3) if v is not None else None) for p, v in zip(PERCENTILES, values)}
+
+
+def parse_server_timing(header: str) -> dict:
+    stages = {}
+    for item in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, _, duration = item.partition(";dur=")
+        if duration:
+            stages[name] = float(duration)
+    return stages
+
+
+def synthetic_face(person: int, variant: int, size: int = 480) -> bytes:
+    """A drawn frontal face; ``person`` fixes the features, ``variant`` the capture noise."""
+    import cv2
+    shape = np.random.default_rng(person)
+    noise = np.random.default_rng((person << 20) + variant + 1)
+    image = np.full((size, size, 3), shape.integers(150, 230, 3), dtype=np.uint8)
+    centre = (size // 2 + int(noise.integers(-6, 7)), size // 2 + int(noise.integers(-6, 7)))
+    axes = (int(size * shape.uniform(0.2, 0.26)), int(size * shape.uniform(0.28, 0.33)))
+    skin = tuple(int(c) for c in shape.integers(90, 220, 3))
+    cv2.ellipse(image, centre, axes, 0, 0, 360, skin, -1)
+    eye_dx, eye_y = int(axes[0] * shape.uniform(0.35, 0.5)), centre[1] - int(axes[1] * 0.2)
+    for side in (-1, 1):
+        eye = (centre[0] + side * eye_dx, eye_y)
+        cv2.ellipse(image, eye, (int(axes[0] * 0.18), int(axes[1] * 0.07)), 0, 0, 360, (250, 250, 250), -1)
+        cv2.circle(image, eye, int(axes[1] * 0.05), (40, 30, 20), -1)
+        cv2.line(image, (eye[0] - int(axes[0] * 0.2), eye[1] - int(axes[1] * 0.15)),
+                 (eye[0] + int(axes[0] * 0.2), eye[1] - int(axes[1] * 0.17)), (50, 40, 30), 4)
+    nose_bottom = centre[1] + int(axes[1] * 0.15)
+    cv2.line(image, (centre[0], eye_y + 10), (centre[0] - 8, nose_bottom), (60, 60, 90), 3)
+    cv2.ellipse(image, (centre[0], centre[1] + int(axes[1] * 0.45)), (int(axes[0] * 0.4), int(axes[1] * 0.1)),
+                0, 0, 180, (60, 40, 150), 4)
+    image = np.clip(image.astype(np.int16) + noise.integers(-6, 7, image.shape), 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def populate(db, students: int, attendance_students: int, days: int, seed: int = 0) -> np.ndarray:
+    """Students with synthetic encodings and a year of attendance; returns the encodings."""
+    from sqlalchemy import delete, insert
+    from app.models import AttendanceRecord, DailyAttendanceSummary, IST, Student
+    from app.face_codec import pack_encoding
+    from benchmarks.bench_matcher import synthetic_gallery
+
+    for model in (AttendanceRecord, DailyAttendanceSummary, Student):
+        db.execute(delete(model))
+    identities, _ = synthetic_gallery(students, 1, seed)
+    for start in range(0, students, BATCH_SIZE):
+        db.execute(insert(Student), [
+            {"id": i + 1, "student_id": f"S{i + 1:06d}", "full_name": f"Student {i + 1}",
+             "face_encoding": pack_encoding(identities[i])}
+            for i in range(start, min(students, start + BATCH_SIZE))
+        ])
+
+    rng = np.random.default_rng(seed)
+    end = date.today() - timedelta(days=1)
+    attending = min(students, attendance_students)
+    summary = Counter()
+    batch = []
+    for offset in range(days - 1, -1, -1):
+        day = end - timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        rolls = rng.random(attending)
+        for index in np.flatnonzero(rolls < 0.9):
+            status = "late" if rolls[index] < 0.05 else "present"
+            batch.append({
+                "student_id": int(index) + 1,
+                "timestamp": datetime(day.year, day.month, day.day, 8, 30, tzinfo=IST) + timedelta(minutes=int(index % 90)),
+                "attendance_date": day,
+                "status": status,
+            })
+            summary[(day, status)] += 1
+        if len(batch) >= BATCH_SIZE:
+            db.execute(insert(AttendanceRecord), batch)
+            batch = []
+    if batch:
+        db.execute(insert(AttendanceRecord), batch)
+    if summary:
+        db.execute(insert(DailyAttendanceSummary), [
+            {"date": day, "status": status, "count": count} for (day, status), count in summary.items()
+        ])
+    db.commit()
+    return identities
+
+
+def drive(client, name: str, requests: list, concurrency: int) -> dict:
+    """Send ``requests`` (method, url, kwargs); latency, throughput, statuses and stages."""
+    def send(request):
+        method, url, kwargs = request
+        began = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        return (time.perf_counter() - began) * 1000.0, response.status_code, response.headers.get("server-timing")
+
+    began = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(send, requests))
+    else:
+        results = [send(request) for request in requests]
+    elapsed = time.perf_counter() - began
+
+    stages = defaultdict(list)
+    for _, _, header in results:
+        for stage, duration in parse_server_timing(header).items():
+            stages[stage].append(duration)
+    return {
+        "endpoint": name,
+        "requests": len(results),
+        "status_counts": dict(Counter(str(status) for _, status, _ in results)),
+        "latency_ms": percentiles([latency for latency, _, _ in results]),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "stages_ms": {stage: percentiles(samples) for stage, samples in sorted(stages.items())},
+    }
+
+
+def run_size(client, students: int, args) -> list:
+    from app.database import SessionLocal
+    from app.gallery import gallery
+    from app.face_codec import pack_encoding
+    from app.models import Student
+    from app.recognition_cache import recent_students
+
+    db = SessionLocal()
+    began = time.perf_counter()
+    identities = populate(db, students, args.attendance_students, args.days)
+    gallery.load(db)
+    recent_students.clear()
+    print(f"\n{students} students ({time.perf_counter() - began:.1f}s to generate)")
+
+    results = []
+    faces = min(args.faces, students)
+    encode_requests = [
+        ("POST", "/api/face-recognition/encode",
+         {"content": synthetic_face(i % faces, i), "headers": {"content-type": "image/jpeg"}})
+        for i in range(args.requests)
+    ]
+    results.append(drive(client, "encode_face", encode_requests, args.concurrency))
+
+    # Enroll the drawn faces that encode as the first students
+    enrolled = {}
+    for person in range(faces):
+        response = client.post("/api/face-recognition/encode", content=synthetic_face(person, 0),
+                               headers={"content-type": "image/jpeg"})
+        if response.status_code == 200:
+            enrolled[person + 1] = response.json()["face_encoding"]
+    for student_pk, encoding in enrolled.items():
+        db.query(Student).filter(Student.id == student_pk).update({"face_encoding": pack_encoding(encoding)})
+        identities[student_pk - 1] = encoding
+    db.commit()
+    gallery.add_many(list(enrolled), list(enrolled.values()))
+
+    recognize_requests = [
+        ("POST", "/api/face-recognition/",
+         {"content": synthetic_face(i % faces, args.requests + i),
+          "headers": {"content-type": "image/jpeg", "x-kiosk-id": "bench"}})
+        for i in range(args.requests)
+    ]
+    results.append(drive(client, "recognize_face", recognize_requests, args.concurrency))
+
+    rng = np.random.default_rng(1)
+    probes = identities[rng.integers(0, students, args.requests)] + rng.normal(0.0, 0.02, (args.requests, identities.shape[1]))
+    mark_requests = [
+        ("POST", "/api/attendance/face-recognition/", {"json": {"face_encoding": probe.tolist()}})
+        for probe in probes
+    ]
+    results.append(drive(client, "mark_attendance_by_face", mark_requests, args.concurrency))
+
+    analytics_requests = [("GET", "/api/attendance/analytics", {"params": {"days": 30}})] * args.requests
+    results.append(drive(client, "get_analytics", analytics_requests, args.concurrency))
+    db.close()
+
+    for result in results:
+        result["students"] = students
+        latency = result["latency_ms"]
+        print(f"  {result['endpoint']:<25}{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+              f"{result['throughput_rps']:>10.1f}   {result['status_counts']}")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, text=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(base_path: str, new_path: str):
+    with open(base_path) as base_file, open(new_path) as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    base_results = {(r["students"], r["endpoint"]): r for r in base["results"]}
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'students':>9}  {'endpoint':<25}{'p50 ms':>16}{'p95 ms':>16}{'req/s':>16}")
+    for result in new["results"]:
+        old = base_results.get((result["students"], result["endpoint"]))
+        if old is None:
+            continue
+        cells = []
+        for old_value, new_value in (
+            (old["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            (old["latency_ms"]["p95"], result["latency_ms"]["p95"]),
+            (old["throughput_rps"], result["throughput_rps"]),
+        ):
+            change = (new_value - old_value) / old_value * 100.0 if old_value else 0.0
+            cells.append(f"{new_value:>8.1f} ({change:+4.0f}%)")
+        print(f"{result['students']:>9}  {result['endpoint']:<25}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and gallery size")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--faces", type=int, default=20, help="distinct synthetic faces")
+    parser.add_argument("--attendance-students", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--workers", type=int, default=0, help="FACE_WORKERS (default: all cores)")
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # The app reads its configuration at import time, so nothing from app is
+    # imported above this point. Every frame is distinct,
+    # so the recognition cache is off; logging stays out of the timings.
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench-suite-')}/suite.db"
+    os.environ["FACE_WORKERS"] = str(args.workers)
+    os.environ["RECOGNITION_CACHE_SIZE"] = "0"
+    os.environ["TRACE_SAMPLE_RATE"] = "0"
+    os.environ["LOG_LEVEL"] = "ERROR"
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.warmup import readiness
+
+    results = []
+    with TestClient(app) as client:
+        while not readiness.ready and readiness.error is None:
+            time.sleep(0.05)
+        print(f"{'':<27}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>10}   statuses")
+        for students in args.students:
+            results.extend(run_size(client, students, args))
+
+    commit = git_commit()
+    output = args.output or os.path.join(os.path.dirname(__file__), "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as result_file:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.platform(),
+                "cpus": os.cpu_count(),
+                "args": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+            },
+            "results": results,
+        }, result_file, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
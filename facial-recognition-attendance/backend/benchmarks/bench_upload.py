@@ -0,0 +1,89 @@
+"""Bytes on the wire and server-side decode time: base64 JSON vs raw uploads.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_upload --width 1280 --height 720 --repeat 50
+
+The JSON path is what the kiosk sends today: a data URL inside JSON, parsed
+by pydantic, base64-decoded and opened with PIL. The raw paths send the JPEG
+bytes as the request body (or a multipart field) and decode them with
+OpenCV straight from the buffer.
+"""
+import argparse
+import base64
+import json
+import time
+import uuid
+import numpy as np
+import cv2
+from io import BytesIO
+from PIL import Image
+from app.routes.face_recognition import ImageRequest, _decode_base64_image
+from app.face_pipeline import decode_image
+
+
+def synthetic_frame(width: int, height: int, quality: int) -> bytes:
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], axis=-1)
+    frame = (frame + rng.integers(0, 24, frame.shape)).clip(0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def multipart_body(jpeg: bytes):
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    return head + jpeg + f"\r\n--{boundary}--\r\n".encode()
+
+
+def json_path(body: bytes) -> np.ndarray:
+    image_request = ImageRequest.model_validate_json(body)
+    image_data = _decode_base64_image(image_request.image)
+    return np.array(Image.open(BytesIO(image_data)))
+
+
+def raw_path(body: bytes) -> np.ndarray:
+    return decode_image(body)
+
+
+def best_ms(fn, body: bytes, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn(body)
+        samples.append(time.perf_counter() - began)
+    return float(np.median(samples)) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    jpeg = synthetic_frame(args.width, args.height, args.quality)
+    json_body = json.dumps(
+        {"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()}
+    ).encode()
+    bodies = {
+        "json (base64)": (json_body, json_path),
+        "multipart": (multipart_body(jpeg), None),
+        "octet-stream": (jpeg, raw_path),
+    }
+
+    print(f"{args.width}x{args.height} JPEG, quality {args.quality}: {len(jpeg)} bytes")
+    print(f"{'path':<16}{'wire bytes':>12}{'vs raw':>8}{'decode ms':>11}")
+    for name, (body, decoder) in bodies.items():
+        decode = f"{best_ms(decoder, body, args.repeat):>11.2f}" if decoder else f"{'(as raw)':>11}"
+        print(f"{name:<16}{len(body):>12}{len(body) / len(jpeg):>8.2f}{decode}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Create the attendance_records indexes added after the per-day key.
+
+Usage (from the backend directory):
+
+    python -m migrations.attendance_indexes [DATABASE_URL or SQLite path ...]
+
+Without arguments the database configured by DATABASE_URL is migrated.
+
+Covers the (timestamp, id) index behind GET /api/attendance/records and
+the (student_id, attendance_date, status) index used by the statistics
+endpoints. Indexes that already exist are left alone.
+"""
+import sys
+from sqlalchemy import inspect
+from app import config
+from app.database import create_db_engine, database_url
+from app.models import AttendanceRecord
+
+
+def upgrade(target: str):
+    engine = create_db_engine(database_url(target))
+    table = AttendanceRecord.__table__
+    columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    if "student_id" not in columns:
+        print(f"{engine.url}: {table.name} predates students (no student_id column), skipped")
+        engine.dispose()
+        return
+
+    existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+    created = []
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=engine)
+            created.append(index.name)
+    engine.dispose()
+    print(f"{engine.url}: created {', '.join(created) or 'no indexes'}")
+
+
+if __name__ == "__main__":
+    for target in sys.argv[1:] or [config.DATABASE_URL]:
+        upgrade(target)
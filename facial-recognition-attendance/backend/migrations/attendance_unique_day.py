@@ -0,0 +1,68 @@
+"""Add attendance_records.attendance_date and the per-day uniqueness index.
+
+Usage (from the backend directory):
+
+    python -m migrations.attendance_unique_day [DATABASE_URL or SQLite path ...]
+
+Without arguments the database configured by DATABASE_URL is migrated.
+
+Steps, each skipped when already applied:
+
+1. add the attendance_date column and fill it with the IST day of each
+   record's timestamp;
+2. delete duplicate records for the same student and day, keeping the
+   earliest one (they would violate the new index);
+3. create the unique (student_id, attendance_date) index;
+4. rebuild daily_attendance_summary, since step 2 may have removed rows.
+"""
+import sys
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.orm import sessionmaker
+from app import config
+from app.database import create_db_engine, database_url
+from app.models import AttendanceRecord, DailyAttendanceSummary, attendance_day
+from app.attendance_summary import rebuild_summary
+
+
+def upgrade(target: str):
+    engine = create_db_engine(database_url(target))
+    table = AttendanceRecord.__table__
+    columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    if "student_id" not in columns:
+        print(f"{engine.url}: {table.name} predates students (no student_id column), skipped")
+        engine.dispose()
+        return
+
+    with engine.begin() as conn:
+        if "attendance_date" not in columns:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN attendance_date DATE"))
+
+        rows = conn.execute(
+            select(table.c.id, table.c.timestamp).where(table.c.attendance_date.is_(None))
+        ).all()
+        for record_id, timestamp in rows:
+            conn.execute(
+                update(table).where(table.c.id == record_id).values(attendance_date=attendance_day(timestamp))
+            )
+
+        duplicates = conn.execute(text(
+            f"DELETE FROM {table.name} WHERE id NOT IN ("
+            f"SELECT MIN(id) FROM {table.name} GROUP BY student_id, attendance_date)"
+        )).rowcount
+
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    DailyAttendanceSummary.__table__.create(bind=engine, checkfirst=True)
+    db = sessionmaker(bind=engine)()
+    try:
+        rebuild_summary(db)
+    finally:
+        db.close()
+    engine.dispose()
+    print(f"{engine.url}: dated {len(rows)} records, removed {duplicates} same-day duplicates")
+
+
+if __name__ == "__main__":
+    for target in sys.argv[1:] or [config.DATABASE_URL]:
+        upgrade(target)
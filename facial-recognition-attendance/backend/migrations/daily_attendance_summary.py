@@ -0,0 +1,34 @@
+"""Create and backfill daily_attendance_summary from attendance_records.
+
+Usage (from the backend directory):
+
+    python -m migrations.daily_attendance_summary [DATABASE_URL or SQLite path ...]
+
+Without arguments the database configured by DATABASE_URL is migrated.
+
+Rebuilds the rollup from scratch, so it also repairs a summary that has
+drifted (e.g. after rows were edited outside the application).
+"""
+import sys
+from sqlalchemy.orm import sessionmaker
+from app import config
+from app.database import create_db_engine, database_url
+from app.models import DailyAttendanceSummary
+from app.attendance_summary import rebuild_summary
+
+
+def upgrade(target: str):
+    engine = create_db_engine(database_url(target))
+    DailyAttendanceSummary.__table__.create(bind=engine, checkfirst=True)
+    db = sessionmaker(bind=engine)()
+    try:
+        rows = rebuild_summary(db)
+    finally:
+        db.close()
+    engine.dispose()
+    print(f"{engine.url}: wrote {rows} daily summary rows")
+
+
+if __name__ == "__main__":
+    for target in sys.argv[1:] or [config.DATABASE_URL]:
+        upgrade(target)
@@ -0,0 +1,51 @@
+"""Convert students.face_encoding from JSON text to float32 blobs.
+
+Usage (from the backend directory):
+
+    python -m migrations.face_encoding_blob [DATABASE_URL or SQLite path ...]
+
+Without arguments the database configured by DATABASE_URL is migrated.
+
+Safe to run more than once: rows that already hold a blob are skipped.
+"""
+import json
+import sys
+from sqlalchemy import text
+from app import config
+from app.database import create_db_engine, database_url
+from app.face_codec import pack_encoding
+
+
+def upgrade(target: str):
+    engine = create_db_engine(database_url(target))
+    if engine.dialect.name != "sqlite":
+        # Only SQLite databases from before the blob format hold JSON text
+        print(f"{engine.url}: not a SQLite database, skipped")
+        engine.dispose()
+        return
+    converted = 0
+    failed = 0
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, face_encoding FROM students "
+            "WHERE face_encoding IS NOT NULL AND typeof(face_encoding) = 'text'"
+        )).all()
+        for student_id, face_encoding in rows:
+            try:
+                blob = pack_encoding(json.loads(face_encoding))
+            except ValueError as e:
+                print(f"  student {student_id}: could not parse encoding ({e}), left unchanged")
+                failed += 1
+                continue
+            conn.execute(
+                text("UPDATE students SET face_encoding = :blob WHERE id = :id"),
+                {"blob": blob, "id": student_id},
+            )
+            converted += 1
+    engine.dispose()
+    print(f"{engine.url}: converted {converted} encodings, {failed} failed")
+
+
+if __name__ == "__main__":
+    for target in sys.argv[1:] or [config.DATABASE_URL]:
+        upgrade(target)
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+# Point the app at a scratch database (and queue log) before it is imported:
+# the engine and the write-behind queue are created from config at import
+_workdir = tempfile.mkdtemp(prefix="attendance-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["ATTENDANCE_LOG_PATH"] = os.path.join(_workdir, "attendance_queue.log")
+os.environ["ATTENDANCE_WRITE_BEHIND"] = "false"
+os.environ["FACE_MATCHER"] = "exact"
+os.environ["GALLERY_PRECISION"] = "float32"
+os.environ["STARTUP_WARMUP"] = "false"
+
+import pytest
+from app.database import Base, SessionLocal, engine
+from app.gallery import gallery
+from app.rosters import roster_index
+from app.attendance_queue import attendance_queue
+from app.recognition_cache import frame_cache, recent_students
+
+
+@pytest.fixture
+def workdir():
+    return _workdir
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables, with the in-memory state reset."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    gallery.clear()
+    roster_index.invalidate()
+    attendance_queue.clear()
+    frame_cache.clear()
+    recent_students.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
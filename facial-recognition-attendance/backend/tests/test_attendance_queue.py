@@ -0,0 +1,85 @@
+import fcntl
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from app import crud, models, schemas
+from app.attendance_queue import AttendanceWriteQueue
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def add_student(db, student_id: str):
+    return crud.create_student(db, schemas.StudentCreate(student_id=student_id, full_name=f"Student {student_id}"))
+
+
+def write_log(path: str, *student_ids: int):
+    with open(path, "w", encoding="utf-8") as log:
+        for student_id in student_ids:
+            event = {"student_id": student_id, "status": "present", "timestamp": datetime.now(IST).isoformat()}
+            log.write(json.dumps(event) + "\n")
+
+
+def marked_ids(db) -> set:
+    db.expire_all()
+    return {record.student_id for record in db.query(models.AttendanceRecord)}
+
+
+def test_recover_leaves_logs_of_running_workers_alone(db, tmp_path):
+    student = add_student(db, "S1")
+    base = str(tmp_path / "queue.log")
+    write_log(f"{base}.999999", student.id)
+    queue = AttendanceWriteQueue(base, 200, 100)
+
+    # Another worker is alive: it holds the lock on its log
+    with open(f"{base}.999999.lock", "a") as other_worker:
+        fcntl.flock(other_worker, fcntl.LOCK_EX)
+        queue.recover()
+        assert marked_ids(db) == set()
+        assert os.path.exists(f"{base}.999999")
+
+    # Once it is gone its events are written and its files removed
+    queue.recover()
+    assert marked_ids(db) == {student.id}
+    assert not os.path.exists(f"{base}.999999")
+    assert not os.path.exists(f"{base}.999999.lock")
+
+
+def test_recover_writes_a_dead_workers_flushing_batch_and_log(db, tmp_path):
+    first, second = add_student(db, "S1"), add_student(db, "S2")
+    base = str(tmp_path / "queue.log")
+    write_log(f"{base}.999999.flushing", first.id)
+    write_log(f"{base}.999999", second.id, first.id)
+    with open(f"{base}.999999", "a", encoding="utf-8") as log:
+        log.write('{"student_id": 3, "sta')  # torn by the crash
+
+    AttendanceWriteQueue(base, 200, 100).recover()
+    assert marked_ids(db) == {first.id, second.id}
+    assert [name for name in os.listdir(tmp_path) if ".999999" in name] == []
+
+
+def test_flush_only_moves_this_process_log(db, tmp_path):
+    student = add_student(db, "S1")
+    base = str(tmp_path / "queue.log")
+    write_log(f"{base}.999999", student.id)
+    queue = AttendanceWriteQueue(base, 200, 100)
+    assert queue.offer(db, student.id)
+    assert queue.flush() == 1
+    assert marked_ids(db) == {student.id}
+    assert os.path.exists(f"{base}.999999")
+    assert not os.path.exists(queue.process_log_path + ".flushing")
+
+
+def test_marks_from_other_routes_are_already_marked(db, tmp_path):
+    bulk, manual, fresh = add_student(db, "S1"), add_student(db, "S2"), add_student(db, "S3")
+    queue = AttendanceWriteQueue(str(tmp_path / "queue.log"), 200, 100)
+    queue.seed(db)
+
+    # Marked after the queue was seeded, without going through it
+    crud.mark_attendance_bulk(db, [schemas.BulkAttendanceItem(student_id=bulk.id)])
+    crud.insert_attendance_once(db, manual.id, "present")
+
+    assert not queue.offer(db, bulk.id)
+    assert not queue.offer(db, manual.id)
+    assert queue.offer(db, fresh.id)
+    assert not queue.offer(db, fresh.id)
+    assert queue.pending == 1
@@ -0,0 +1,46 @@
+from datetime import date, datetime, timedelta, timezone
+from app import crud, models, schemas
+
+UTC = timezone.utc
+
+
+def add_student(db, student_id="S1"):
+    return crud.create_student(db, schemas.StudentCreate(student_id=student_id, full_name=f"Student {student_id}"))
+
+
+def test_utc_timestamp_is_stored_as_ist(db):
+    student = add_student(db)
+    crud.insert_attendance_ignore_duplicates(db, [
+        {"student_id": student.id, "status": "present", "timestamp": datetime(2026, 10, 17, 20, 0, tzinfo=UTC)}
+    ])
+    db.commit()
+
+    record = db.query(models.AttendanceRecord).one()
+    assert record.attendance_date == date(2026, 10, 18)
+    assert record.timestamp.replace(tzinfo=None) == datetime(2026, 10, 18, 1, 30)
+
+
+def test_bulk_utc_timestamp_is_found_by_its_ist_day(client, db):
+    student = add_student(db)
+    response = client.post("/api/attendance/bulk", json={"records": [
+        {"student_id": student.id, "status": "present", "timestamp": "2026-10-17T20:00:00Z"}
+    ]})
+    assert response.status_code == 200
+    assert response.json()["outcomes"][0]["attendance_date"] == "2026-10-18"
+
+    records = client.get("/api/attendance/records", params={"from": "2026-10-18"}).json()["records"]
+    assert [record["student_id"] for record in records] == [student.id]
+    assert records[0]["timestamp"].startswith("2026-10-18T01:30:00")
+    assert client.get("/api/attendance/records", params={"to": "2026-10-17"}).json()["records"] == []
+
+
+def test_bulk_dedupes_across_zones_on_the_ist_day(db):
+    student = add_student(db)
+    same_ist_day = [
+        schemas.BulkAttendanceItem(student_id=student.id, timestamp=datetime(2026, 10, 17, 20, 0, tzinfo=UTC)),
+        schemas.BulkAttendanceItem(
+            student_id=student.id, timestamp=datetime(2026, 10, 18, 9, 0, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+        ),
+    ]
+    outcomes = crud.mark_attendance_bulk(db, same_ist_day)
+    assert [outcome["outcome"] for outcome in outcomes] == ["marked", "duplicate_in_request"]
@@ -0,0 +1,37 @@
+import numpy as np
+from app import crud, schemas
+
+
+def encoding(seed: int) -> list:
+    vector = np.random.default_rng(seed).normal(size=128)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def enroll(db, student_id: str, seed: int):
+    return crud.create_student(db, schemas.StudentCreate(
+        student_id=student_id, full_name=f"Student {student_id}", face_encoding=encoding(seed)
+    ))
+
+
+def test_already_marked_is_a_400(client, db):
+    student = enroll(db, "S1", 1)
+    first = client.post("/api/attendance/face-recognition/", json={"face_encoding": encoding(1)})
+    assert first.status_code == 200
+    assert first.json()["student_id"] == student.id
+
+    second = client.post("/api/attendance/face-recognition/", json={"face_encoding": encoding(1)})
+    assert second.status_code == 400
+    assert second.json()["detail"] == "Attendance already marked for today"
+
+
+def test_unknown_session_is_a_404(client, db):
+    enroll(db, "S1", 1)
+    response = client.post("/api/attendance/face-recognition/", json={"face_encoding": encoding(1), "session_id": 999})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Session 999 not found"
+
+
+def test_no_match_is_a_404(client, db):
+    enroll(db, "S1", 1)
+    response = client.post("/api/attendance/face-recognition/", json={"face_encoding": encoding(2)})
+    assert response.status_code == 404
@@ -0,0 +1,24 @@
+from app.recognition_cache import MISS, FrameResultCache
+
+
+def test_near_identical_frame_hits_for_the_same_kiosk():
+    cache = FrameResultCache(max_entries=8, ttl_seconds=60, max_distance=2)
+    cache.put("kiosk-1", 0b1011, 1, {"id": 7})
+    assert cache.get("kiosk-1", 0b1010, 1) == {"id": 7}
+
+
+def test_other_kiosks_do_not_share_results():
+    cache = FrameResultCache(max_entries=8, ttl_seconds=60, max_distance=2)
+    cache.put("kiosk-1", 0b1011, 1, {"id": 7})
+    assert cache.get("kiosk-2", 0b1011, 1) is MISS
+
+    cache.put("kiosk-2", 0b1011, 1, None)
+    assert cache.get("kiosk-1", 0b1011, 1) == {"id": 7}
+    assert cache.get("kiosk-2", 0b1011, 1) is None
+
+
+def test_entries_from_an_older_generation_are_dropped():
+    cache = FrameResultCache(max_entries=8, ttl_seconds=60, max_distance=2)
+    cache.put("kiosk-1", 0b1011, 1, {"id": 7})
+    assert cache.get("kiosk-1", 0b1011, 2) is MISS
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,54 @@
+import numpy as np
+from app import crud, schemas
+from app.rosters import RosterIndex
+from app.shared_gallery import SharedCounter
+
+
+def encoding(seed: int) -> list:
+    vector = np.random.default_rng(seed).normal(size=128)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def enroll(db, student_id: str, seed: int):
+    return crud.create_student(db, schemas.StudentCreate(
+        student_id=student_id, full_name=f"Student {student_id}", face_encoding=encoding(seed)
+    ))
+
+
+def make_section(db, students) -> int:
+    course = crud.create_course(db, schemas.CourseCreate(code="CS101", name="Programming"))
+    section = crud.create_section(db, course.id, schemas.SectionCreate(name="A"))
+    crud.set_section_roster(db, section.id, [student.id for student in students])
+    return section.id
+
+
+def test_roster_students_match_within_the_roster(db):
+    on_roster, elsewhere = enroll(db, "S1", 1), enroll(db, "S2", 2)
+    section_id = make_section(db, [on_roster])
+    index = RosterIndex()
+
+    ids, _, scopes = index.search(db, section_id, np.array([encoding(1), encoding(2)]), threshold=0.6)
+    assert ids[:, 0].tolist() == [on_roster.id, elsewhere.id]
+    assert scopes == ["roster", "fallback"]
+
+    ids, _, scopes = index.search(db, None, np.array(encoding(2)), threshold=0.6)
+    assert ids[0, 0] == elsewhere.id
+    assert scopes == ["global"]
+
+
+def test_roster_change_in_one_worker_reaches_the_others(db, tmp_path):
+    # Two server processes, each with its own RosterIndex over the shared counter
+    first, second = enroll(db, "S1", 1), enroll(db, "S2", 2)
+    section_id = make_section(db, [first])
+    path = str(tmp_path / "roster_version")
+    worker_a = RosterIndex(shared_generation=SharedCounter(path))
+    worker_b = RosterIndex(shared_generation=SharedCounter(path))
+    assert worker_a.matcher(db, section_id).search(np.array([encoding(1)]))[0][0, 0] == first.id
+
+    crud.set_section_roster(db, section_id, [second.id])
+    worker_b.invalidate()
+
+    assert worker_a.generation == worker_b.generation == 1
+    matcher = worker_a.matcher(db, section_id)
+    assert len(matcher) == 1
+    assert matcher.search(np.array([encoding(2)]))[0][0, 0] == second.id
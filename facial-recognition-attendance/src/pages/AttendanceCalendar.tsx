@@ -64,15 +64,20 @@ const AttendanceCalendar: React.FC = () => {
   const [selectedDate, setSelectedDate] = useState<Date | null>(null);
   const [dateAttendance, setDateAttendance] = useState<AttendanceRecord[]>([]);
 
-  // Fetch all attendance records
+  // Fetch attendance records for the days shown in the calendar
   const fetchData = async () => {
     setLoading(true);
     setError(null);
     
     try {
+      const days = getCalendarDays(currentDate.getFullYear(), currentDate.getMonth());
+      
       // Use Promise.allSettled to prevent one failed API call from blocking everything
       const results = await Promise.allSettled([
-        attendanceService.getAllAttendance(),
+        attendanceService.getAttendanceRange({
+          from: formatDate(days[0]),
+          to: formatDate(days[days.length - 1])
+        }),
         studentService.getAllStudents()
       ]);
       
@@ -100,7 +105,7 @@ const AttendanceCalendar: React.FC = () => {
 
   useEffect(() => {
     fetchData();
-  }, []);
+  }, [currentDate.getFullYear(), currentDate.getMonth()]);
 
   // Update calendar days when month/year changes
   useEffect(() => {
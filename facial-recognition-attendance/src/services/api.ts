@@ -1,5 +1,5 @@
 import axios, { InternalAxiosRequestConfig, AxiosResponse } from 'axios';
-import { Student, AttendanceRecord, FaceRecognitionResponse } from '../types';
+import { Student, AttendanceRecord, AttendancePage, AttendanceRangeQuery, MonthGrid, StudentStats, FaceRecognitionResponse } from '../types';
 
 const API_URL = 'http://localhost:8000/api';
 
@@ -41,6 +41,8 @@ export const studentService = {
 // Attendance service
 export const attendanceService = {
   markAttendance: (studentId: number) => api.post<AttendanceRecord>('/attendance', { student_id: studentId }),
+  markAttendanceBulk: (records: { student_id: number; status?: string; timestamp?: string }[]) =>
+    api.post('/attendance/bulk', { records }),
   markAttendanceByFace: (faceEncoding: number[]) => api.post<FaceRecognitionResponse>('/attendance/face-recognition', { face_encoding: faceEncoding }),
   getTodayAttendance: async () => {
     try {
@@ -67,17 +69,55 @@ export const attendanceService = {
     const response = await api.get<AttendanceRecord[]>('/attendance');
     return response.data;
   },
+  getAttendancePage: async (query: AttendanceRangeQuery, cursor?: string | null, limit = 500) => {
+    const response = await api.get<AttendancePage>('/attendance/records', {
+      params: { ...query, cursor: cursor || undefined, limit },
+    });
+    return response.data;
+  },
+  // Follows next_cursor until the range is exhausted; keep ranges bounded (e.g. one month)
+  getAttendanceRange: async (query: AttendanceRangeQuery) => {
+    const records: AttendanceRecord[] = [];
+    let cursor: string | null = null;
+    do {
+      const page: AttendancePage = await attendanceService.getAttendancePage(query, cursor);
+      records.push(...page.records);
+      cursor = page.next_cursor;
+    } while (cursor);
+    return records;
+  },
+  // counts[status][i] is the number of records with that status on day i + 1
+  getMonthGrid: async (month?: string) => {
+    const response = await api.get<MonthGrid>('/attendance/calendar', { params: { month } });
+    return response.data;
+  },
+  getStudentStats: async (from?: string, to?: string) => {
+    const response = await api.get<StudentStats>('/attendance/student-stats', { params: { from, to } });
+    return response.data;
+  },
   getAnalytics: async () => {
     const response = await api.get('/attendance/analytics');
     return response.data;
   }
 };
 
+// Identifies this browser to the backend's per-kiosk recognition cache
+const getKioskId = () => {
+  let kioskId = localStorage.getItem('kioskId');
+  if (!kioskId) {
+    kioskId = Math.random().toString(36).slice(2, 12);
+    localStorage.setItem('kioskId', kioskId);
+  }
+  return kioskId;
+};
+
 // Face recognition service
 export const faceRecognitionService = {
   recognizeFace: async (imageData: string) => {
     const response = await api.post('/face-recognition', {
       image: imageData,
+    }, {
+      headers: { 'X-Kiosk-Id': getKioskId() },
     });
     return response.data;
   },
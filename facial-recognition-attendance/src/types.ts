@@ -12,6 +12,38 @@ export interface AttendanceRecord {
   status: 'present' | 'absent';
 }
 
+export interface AttendancePage {
+  records: AttendanceRecord[];
+  next_cursor: string | null;
+}
+
+export interface AttendanceRangeQuery {
+  from?: string;
+  to?: string;
+  student_id?: number;
+  status?: string;
+}
+
+export interface MonthGrid {
+  month: string;
+  days: number;
+  total_students: number;
+  counts: Record<string, number[]>;
+}
+
+// Parallel arrays, one entry per student
+export interface StudentStats {
+  from: string;
+  to: string;
+  school_days: number;
+  student_ids: number[];
+  names: string[];
+  attended: number[];
+  late: number[];
+  rate: number[];
+  longest_streak: number[];
+}
+
 export interface FaceRecognitionResponse extends AttendanceRecord {
   full_name?: string;
   message?: string;